@@ -1,14 +1,29 @@
-import datetime
-import re
+import os
+import time
+import asyncio
+import logging
+from typing import Optional
 
 from aiogram import types, Router, F
 from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
 
-from bot.data import get_user_lib
-from hubble.getters import get_series_dates
+from bot.data.aio import get_user_lib
+from bot.data.calendar import release_calendar
+from bot.helpers.release_calendar import is_stale, refresh_series
+from bot.helpers.tasks import chat_tasks
+from hubble.series_dates import DAY, MONTH, parse_release_date
 
+logger = logging.getLogger(__name__)
 router = Router()
 
+# Parallel Hubble lookups per /dates call (only for series the release calendar has no fresh data on)
+DATES_CONCURRENCY = int(os.getenv("DATES_CONCURRENCY", "6"))
+# A series that takes longer than this is reported as "не удалось проверить"
+DATES_TIMEOUT = float(os.getenv("DATES_TIMEOUT", "8.0"))
+# Minimum pause between edits of the streamed reply (Telegram rate limits edits)
+DATES_EDIT_INTERVAL = float(os.getenv("DATES_EDIT_INTERVAL", "1.0"))
+
 
 MONTHS_BY_NUM = {
     1: "января", 2: "февраля", 3: "марта", 4: "апреля",
@@ -16,107 +31,167 @@ MONTHS_BY_NUM = {
     9: "сентября", 10: "октября", 11: "ноября", 12: "декабря",
 }
 
+MONTHS_NOMINATIVE = {
+    1: "январь", 2: "февраль", 3: "март", 4: "апрель",
+    5: "май", 6: "июнь", 7: "июль", 8: "август",
+    9: "сентябрь", 10: "октябрь", 11: "ноябрь", 12: "декабрь",
+}
 
-@router.message(Command("dates"))
-@router.message(F.text == "📅 Даты выхода")
-async def dates(message: types.Message):
-    user_lib = get_user_lib(message.chat.id)
-    user_tvseries: list[dict] = user_lib.get("tvseries", {})
+# Lookup outcome for a series that timed out or failed
+FAILED = object()
 
-    if not user_tvseries:
-        await message.answer(
-            "<b>У вас нет сериалов в коллекции. 😒</b>", parse_mode="HTML"
-        )
-        return
 
-    await message.answer("<b>Сейчас всё проверю, секунду! 🤔</b>", parse_mode="HTML")
-
-    # GETTING ALL TVSERIES DATA
-    tvseries_not_sorted = []
-    for tvseries in user_tvseries.values():
-        title = tvseries.get("title_russian")
-        tvseries_dates_data = await get_series_dates(title)
-
-        production_year = tvseries_dates_data.get("production_year", "")
-        is_next_season_in_prod = tvseries_dates_data.get("is_next_season_in_prod", "")
-        new_episode_release_date = tvseries_dates_data.get("new_seria_date", "")
-        seasons_dates_data = tvseries_dates_data.get("seasons", [])
-
-        tvseries_not_sorted.append(
-            {
-                "title": title,
-                "production_year": production_year,
-                "is_next_season_in_prod": is_next_season_in_prod,
-                "new_episode_release_date": new_episode_release_date,
-                "seasons": seasons_dates_data,
-            }
-        )
+def _release_text(raw_date) -> str:
+    release = parse_release_date(raw_date)
+    if release is None:
+        return "дата неизвестна"
+    if release.precision == DAY:
+        return f"{release.day} {MONTHS_BY_NUM[release.month]}"
+    if release.precision == MONTH:
+        return f"{MONTHS_NOMINATIVE[release.month]} {release.year}"
+    return f"{release.year} год"
 
-    # IF NO 'new_episode_release_date' sorting by seasons.episodes.release_date
-    for tvseries in tvseries_not_sorted:
-        if not tvseries.get("new_episode_release_date"):
-            seasons = tvseries.get("seasons")
-            for season in seasons:
-                episodes = season.get("episodes")
-                for episode in episodes:
-                    try:
-                        release_date = datetime.datetime.strptime(
-                            episode.get("release_date"), "%Y-%m-%d"
-                        )
-                        if release_date > datetime.datetime.now():
-                            tvseries["new_episode_release_date"] = release_date
-                            break
-                    except Exception:
-                        continue
-
-            if not tvseries.get("new_episode_release_date"):
-                tvseries["new_episode_release_date"] = None
-
-    # SORTING TVSERIES
-    tvseries_sorted_by_new_series_dates = []
-    tvseries_withous_new_series_dates = []
-    for tvseries in tvseries_not_sorted:
-        if tvseries.get("new_episode_release_date"):
-            tvseries_sorted_by_new_series_dates.append(tvseries)
-        else:
-            tvseries_withous_new_series_dates.append(tvseries)
 
+def _release_sort_key(raw_date) -> tuple:
+    # Nearest first; a month or a year sorts after the exact days within it
+    release = parse_release_date(raw_date)
+    if release is None:
+        return (1, 0, 0, 0)
+    return (0, release.year, release.month or 13, release.day or 32)
+
+
+def _render_dates(series: dict[str, str], results: dict, cached: Optional[int] = None) -> str:
+    """
+    Upcoming dates of the series resolved so far, nearest first.
+    series: series_id -> title; results: series_id -> CalendarEntry | FAILED (missing = pending);
+    cached: how many series came from the calendar without asking Hubble, shown once all resolved.
+    """
     answer_text = "<b>📅 Даты выхода сериалов:</b>\n\n"
+    upcoming = []
+    for series_id, title in series.items():
+        entry = results.get(series_id)
+        if entry is None or entry is FAILED or not entry.next_date:
+            continue
+        upcoming.append((_release_sort_key(entry.next_date), title, entry.next_date))
+    for _, title, next_date in sorted(upcoming):
+        answer_text += f"{title} - {_release_text(next_date)}\n"
+
+    pending = sum(1 for series_id in series if series_id not in results)
+    failed = [title for series_id, title in series.items() if results.get(series_id) is FAILED]
+    if pending:
+        answer_text += f"\n⏳ Ещё проверяю: {pending}"
+    elif failed:
+        answer_text += "\n<b>⚠️ Не удалось проверить:</b>\n" + "\n".join(failed)
+    if cached is not None and not pending:
+        answer_text = answer_text.rstrip("\n") + f"\n\n<i>Из кэша: {cached} из {len(series)}</i>"
+    return answer_text
+
+
+async def _lookup(series_id: str, title: str, slots: asyncio.Semaphore, fallback=None):
+    """Refreshes one series; on failure falls back to its last known entry, if any."""
+    async with slots:
+        try:
+            entry = await asyncio.wait_for(refresh_series(series_id, title), timeout=DATES_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Series dates lookup timed out: %s", title)
+            entry = None
+    return series_id, entry or fallback or FAILED
+
+
+async def _edit(message: types.Message, text: str) -> None:
+    try:
+        await message.edit_text(text, parse_mode="HTML")
+    except TelegramBadRequest:
+        # "message is not modified" and friends: the next edit catches up
+        pass
+
 
-    for tvseries in tvseries_sorted_by_new_series_dates:
-        title = tvseries.get("title")
-        raw_date = tvseries.get("new_episode_release_date", "")
+@router.message(Command("dates"))
+@router.message(F.text == "📅 Даты выхода")
+async def dates(message: types.Message):
+    chat_tasks.cancel(message.chat.id, "prefetch")  # left the search carousel
+    # A repeated tap restarts the check instead of running two side by side
+    await chat_tasks.run_exclusive(message.chat.id, "dates", _send_dates(message))
 
-        new_episode_release_text = "дата неизвестна"
 
-        if isinstance(raw_date, datetime.datetime):
-            day = raw_date.day
-            month_name = MONTHS_BY_NUM.get(raw_date.month, "")
-            new_episode_release_text = f"{day} {month_name}"
+async def _send_dates(message: types.Message) -> None:
+    user_tvseries: dict = await get_user_lib(message.chat.id, "tvseries")
+    series = {
+        series_id: tvseries.get("title_russian")
+        for series_id, tvseries in user_tvseries.items()
+        if tvseries.get("title_russian")
+    }
 
-        elif isinstance(raw_date, str):
-            if re.match(r"^\d{4}-00-00$", raw_date):
-                year = raw_date.split("-")[0]
-                new_episode_release_text = f"{year} год"
-            elif re.match(r"^\d{4}-\d{2}-\d{2}$", raw_date):
-                try:
-                    parsed = datetime.datetime.strptime(raw_date, "%Y-%m-%d")
-                    day = parsed.day
-                    month_name = MONTHS_BY_NUM.get(parsed.month, "")
-                    new_episode_release_text = f"{day} {month_name}"
-                except Exception:
-                    pass
-            elif re.match(r"^\d{4}$", raw_date):
-                new_episode_release_text = f"{raw_date} год"
+    if not series:
+        await message.answer(
+            "<b>У вас нет сериалов в коллекции. 😒</b>", parse_mode="HTML"
+        )
+        return
 
-        answer_text += f"{title} - {new_episode_release_text}\n"
+    # Dates come from the shared release calendar; Hubble is only asked
+    # about series that were never fetched or whose data could have changed
+    now = time.time()
+    known = await release_calendar.aget_many(series)
+    results: dict = {}
+    stale: dict = {}
+    for sid in series:
+        entry = known.get(sid)
+        if entry is not None and not is_stale(entry, now):
+            results[sid] = entry
+        elif entry is not None and entry.fetched_at is None and entry.failures and entry.next_refresh > now:
+            # First fetch failed and the scheduler retries it later
+            results[sid] = FAILED
+        else:
+            stale[sid] = entry if entry is not None and entry.fetched_at is not None else None
+    cached = len(results) - sum(1 for entry in results.values() if entry is FAILED)
 
-    await message.answer(answer_text, parse_mode="HTML")
+    if not stale:
+        await message.answer(_render_dates(series, results, cached), parse_mode="HTML")
+    else:
+        await release_calendar.aregister({sid: series[sid] for sid in stale})
+        progress = await message.answer("<b>Сейчас всё проверю, секунду! 🤔</b>", parse_mode="HTML")
+        await _stream_lookups(progress, series, results, stale, cached)
 
     # SENDING CLOSED TVSERIES
-    if tvseries_withous_new_series_dates:
+    closed = [
+        title for series_id, title in series.items()
+        if results[series_id] is not FAILED and not results[series_id].next_date
+    ]
+    if closed:
         answer_text = "\n<b>😥 Завершённые сериалы:</b>\n\n"
-        for tvseries in tvseries_withous_new_series_dates:
-            title = tvseries.get("title")
+        for title in closed:
             answer_text += f"{title}\n"
         await message.answer(answer_text, parse_mode="HTML")
+
+
+async def _stream_lookups(
+    progress: types.Message, series: dict[str, str], results: dict, stale: dict, cached: int
+) -> None:
+    """
+    Fetches the stale series (series_id -> last known entry or None),
+    editing the reply as they resolve.
+    """
+    slots = asyncio.Semaphore(DATES_CONCURRENCY)
+    tasks = [
+        asyncio.ensure_future(_lookup(series_id, series[series_id], slots, fallback))
+        for series_id, fallback in stale.items()
+    ]
+
+    shown = ""
+    last_edit = 0.0
+    loop = asyncio.get_running_loop()
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            series_id, entry = await next_done
+            results[series_id] = entry
+            if len(results) == len(series) or loop.time() - last_edit < DATES_EDIT_INTERVAL:
+                continue
+            text = _render_dates(series, results)
+            if text != shown:
+                await _edit(progress, text)
+                shown, last_edit = text, loop.time()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    await _edit(progress, _render_dates(series, results, cached))
@@ -13,6 +13,7 @@ HELP_MESSAGE = """<b>Всё просто 👋</b>
 Листай ◀ ▶, фильтруй: фильмы, сериалы, просмотренные, непросмотренные, рекомендованные.
 
 📅 <b>Даты выхода</b> — когда выйдут новые серии добавленных сериалов.
+🔔 /notify on — напоминание в день выхода новой серии, /notify off — выключить.
 
 🎲 <b>Что посмотреть?</b> — случайный из библиотеки, подбор по настроению или сюрприз от AI.
 """
@@ -1,3 +1,4 @@
+import os
 import asyncio
 import logging
 
@@ -12,13 +13,31 @@ from aiogram.types import (
 )
 
 from bot.conversation import create_message_founded
-from hubble.getters import get_search, get_info, enrich_with_watch_url
+from bot.helpers.content import fetch_full_info
+from bot.helpers.tasks import chat_tasks
+from hubble.cache import TTLCache
+from hubble.getters import get_search
 
 logger = logging.getLogger(__name__)
 router = Router()
 
-MAX_RESULTS = 10
+PAGE_SIZE = int(os.getenv("INLINE_PAGE_SIZE", "5"))
 MIN_QUERY_LEN = 2
+# Results not enriched within this budget are answered from bare search data
+INLINE_DEADLINE = float(os.getenv("INLINE_DEADLINE", "1.2"))
+# Keystroke bursts: only the query that stays unchanged this long is answered
+INLINE_DEBOUNCE = float(os.getenv("INLINE_DEBOUNCE", "0.35"))
+INLINE_CACHE_TTL = float(os.getenv("INLINE_CACHE_TTL", "120"))
+
+# (normalized query, offset) -> (results, next_offset) of complete answers
+_answers = TTLCache(maxsize=1000)
+# "typename:id" -> built enriched result, reused when a refined prefix finds the same title
+_built_items = TTLCache(maxsize=2000)
+
+
+def _normalize_query(query: str) -> str:
+    """Key of the answer cache: case, ё/е and spacing don't matter there."""
+    return " ".join(query.lower().replace("ё", "е").split())
 
 
 def _poster_urls(data: dict) -> tuple[str | None, str | None]:
@@ -80,24 +99,43 @@ def _build_result(data: dict):
     )
 
 
-async def _fetch_full_info(item: dict) -> dict:
-    if item.get("typename") == "person":
-        return item
-    info = await get_info(item["typename"], item["id"])
-    merged = {**item, **info}
-    merged = await enrich_with_watch_url(merged)
-    return merged
+async def _enrich(item: dict, deadline: float) -> dict | None:
+    try:
+        return await fetch_full_info(item, deadline=deadline)
+    except Exception:
+        logger.warning("Inline enrichment failed for %s", item.get("id"), exc_info=True)
+        return None
 
 
 @router.inline_query()
 async def handle_inline_query(inline_query: InlineQuery):
-    query = inline_query.query.strip()
+    query = _normalize_query(inline_query.query)
     if len(query) < MIN_QUERY_LEN:
         await inline_query.answer([], cache_time=5)
         return
 
+    offset = inline_query.offset or ""
+    cached = _answers.get((query, offset))
+    if cached is not None:
+        results, next_offset = cached
+        await inline_query.answer(results, cache_time=30, next_offset=next_offset)
+        return
+
+    # A newer keystroke from the same user supersedes (cancels) this one
+    await chat_tasks.run_exclusive(
+        inline_query.from_user.id, "inline_query", _answer_inline_query(inline_query, query, offset)
+    )
+
+
+async def _answer_inline_query(inline_query: InlineQuery, query: str, offset: str) -> None:
+    if INLINE_DEBOUNCE > 0 and not offset:
+        await asyncio.sleep(INLINE_DEBOUNCE)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
     try:
-        search_data = await get_search(query)
+        # The normalized query only keys the answer cache; Hubble gets what the user typed
+        search_data = await get_search(inline_query.query.strip())
     except Exception:
         logger.exception("Inline search API error for query: %s", query)
         await inline_query.answer([], cache_time=5)
@@ -120,19 +158,44 @@ async def handle_inline_query(inline_query: InlineQuery):
             seen.add(key)
             unique.append(item)
 
-    # Fetch full info + watch URL for ALL results in parallel
-    enriched = await asyncio.gather(
-        *(_fetch_full_info(it) for it in unique[:MAX_RESULTS]),
-        return_exceptions=True,
-    )
-
-    # Build result list
+    try:
+        start = max(int(offset or 0), 0)
+    except ValueError:
+        start = 0
+    page = unique[start:start + PAGE_SIZE]
+    next_offset = str(start + PAGE_SIZE) if start + PAGE_SIZE < len(unique) else ""
+
+    # Enrich what isn't built yet in parallel, but only wait INLINE_DEADLINE. Late fetches
+    # keep running in the background and land in the catalog for the next keystroke.
+    remaining = max(INLINE_DEADLINE - (loop.time() - started), 0.05)
+    prebuilt = [_built_items.get(f"{it.get('typename')}:{it.get('id')}") for it in page]
+    tasks = [
+        None if built is not None
+        else chat_tasks.spawn(inline_query.from_user.id, "inline", _enrich(it, remaining))
+        for it, built in zip(page, prebuilt)
+    ]
+    pending = [task for task in tasks if task is not None]
+    if pending:
+        await asyncio.wait(pending, timeout=remaining)
+
+    # Build result list, falling back to the bare search item for late/failed ones
     results = []
-    for result in enriched:
-        if isinstance(result, Exception) or not result:
+    partial = False
+    for bare, built, task in zip(page, prebuilt, tasks):
+        if built is not None:
+            results.append(built)
             continue
-        item = _build_result(result)
+        if task.done() and not task.cancelled() and task.result():
+            item = _build_result(task.result())
+            if item:
+                _built_items.set(item.id, item, INLINE_CACHE_TTL)
+        else:
+            partial = True
+            item = _build_result(bare)
         if item:
             results.append(item)
 
-    await inline_query.answer(results, cache_time=30)
+    # Partial answers are cached briefly so Telegram asks again once enrichment is done
+    if not partial:
+        _answers.set((query, offset), (results, next_offset), INLINE_CACHE_TTL)
+    await inline_query.answer(results, cache_time=5 if partial else 30, next_offset=next_offset)
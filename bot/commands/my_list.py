@@ -2,9 +2,11 @@ from aiogram import types, Router, F
 from aiogram.filters import Command
 from aiogram.exceptions import TelegramBadRequest
 
-from bot.data import get_filtered_lib, mark_viewed_only, set_recommend_status, delete_content_from_user_lib
+from bot.data.aio import get_lib_page, mark_viewed_only, set_recommend_status, delete_content_from_user_lib
 from bot.keyboards import build_library_keyboard
 from bot.helpers.send import edit_library_card
+from bot.helpers.tasks import chat_tasks
+from bot.helpers.content import refresh_in_background
 from bot.conversation.messages_creator.library import create_library_message
 
 router = Router()
@@ -27,9 +29,9 @@ async def _show_library(
     Renders a library carousel card. Sends a new message or edits an existing one.
     message_to_edit: the Message object to call edit_* on, or None to send new.
     """
-    items = get_filtered_lib(chat_id, filter_key)
+    item, idx, total = await get_lib_page(chat_id, filter_key, idx)
 
-    if not items:
+    if item is None:
         text = EMPTY_MSG
         if message_to_edit:
             try:
@@ -43,11 +45,9 @@ async def _show_library(
             await bot.send_message(chat_id, text, parse_mode="HTML")
         return
 
-    idx = max(0, min(idx, len(items) - 1))
-    item = items[idx]
-
+    refresh_in_background(chat_id, item)
     caption = create_library_message(item)
-    keyboard = build_library_keyboard(item, idx=idx, total=len(items), current_filter=filter_key)
+    keyboard = build_library_keyboard(item, idx=idx, total=total, current_filter=filter_key)
 
     if message_to_edit:
         await edit_library_card(message_to_edit, item, caption, keyboard)
@@ -85,6 +85,7 @@ async def _show_library(
 @router.message(Command("list"))
 @router.message(F.text == "📋 Библиотека")
 async def show_library(message: types.Message):
+    chat_tasks.cancel(message.chat.id, "prefetch")  # left the search carousel
     await _show_library(message.bot, message.chat.id, filter_key="all", idx=0)
 
 
@@ -123,7 +124,7 @@ def _parse_lib_action(data: str):
 @router.callback_query(F.data.startswith("lv:"))
 async def handle_lib_viewed(callback: types.CallbackQuery):
     action, content_type, content_id, filt, idx = _parse_lib_action(callback.data)
-    mark_viewed_only(callback.message.chat.id, content_type, content_id)
+    await mark_viewed_only(callback.message.chat.id, content_type, content_id)
     await callback.answer("✅ Просмотрено!")
     await _show_library(callback.bot, callback.message.chat.id, filt, idx, callback.message)
 
@@ -131,7 +132,7 @@ async def handle_lib_viewed(callback: types.CallbackQuery):
 @router.callback_query(F.data.startswith("ld:"))
 async def handle_lib_delete(callback: types.CallbackQuery):
     action, content_type, content_id, filt, idx = _parse_lib_action(callback.data)
-    delete_content_from_user_lib(callback.message.chat.id, content_type, content_id)
+    await delete_content_from_user_lib(callback.message.chat.id, content_type, content_id)
     await callback.answer("Удалено!")
     # After delete: show item at same position (or last if we were at the end)
     await _show_library(callback.bot, callback.message.chat.id, filt, idx, callback.message)
@@ -141,7 +142,7 @@ async def handle_lib_delete(callback: types.CallbackQuery):
 async def handle_lib_recommend(callback: types.CallbackQuery):
     action, content_type, content_id, filt, idx = _parse_lib_action(callback.data)
     recommend = action == "lr1"
-    set_recommend_status(callback.message.chat.id, content_type, content_id, recommend)
+    await set_recommend_status(callback.message.chat.id, content_type, content_id, recommend)
     await callback.answer("👍 Советую ✓" if recommend else "👎 Не советую ✓")
     # Refresh caption + keyboard (status text changes in caption)
     await _show_library(callback.bot, callback.message.chat.id, filt, idx, callback.message)
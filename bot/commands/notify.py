@@ -0,0 +1,31 @@
+from aiogram import types, Router
+from aiogram.filters import Command, CommandObject
+
+from bot.data.notifications import notification_store
+
+router = Router()
+
+
+NOTIFY_ON_MESSAGE = """<b>🔔 Уведомления включены</b>
+
+В день выхода новой серии сериала из твоей библиотеки я пришлю сообщение.
+Выключить: /notify off"""
+
+NOTIFY_OFF_MESSAGE = """<b>🔕 Уведомления выключены</b>
+
+Включить: /notify on"""
+
+
+@router.message(Command("notify"))
+async def notify(message: types.Message, command: CommandObject):
+    arg = (command.args or "").strip().lower()
+    if arg in ("on", "вкл"):
+        await notification_store.asubscribe(message.chat.id)
+        subscribed = True
+    elif arg in ("off", "выкл"):
+        await notification_store.aunsubscribe(message.chat.id)
+        subscribed = False
+    else:
+        subscribed = await notification_store.ais_subscribed(message.chat.id)
+
+    await message.answer(NOTIFY_ON_MESSAGE if subscribed else NOTIFY_OFF_MESSAGE, parse_mode="HTML")
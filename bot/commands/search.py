@@ -1,5 +1,8 @@
+import os
+import asyncio
 import logging
 from aiogram import types, Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import default_state
 
@@ -7,41 +10,36 @@ from bot.states import SearchState
 from bot.helpers import is_search_query_valid
 from bot.keyboards import build_card_keyboard
 from bot.helpers.send import send_new_card, edit_card_content
+from bot.helpers.content import fetch_full_info, fetch_info_progressive, has_info
+from bot.helpers.tasks import chat_tasks
 from bot.conversation import get_random_content_not_found
-from bot.data import (
-    get_user_lib,
+from bot.data.aio import (
+    get_lib_item,
     is_content_in_user_lib,
     save_content_to_user_lib,
     delete_content_from_user_lib,
     mark_viewed_only,
     set_recommend_status,
 )
-from hubble.getters import get_search, get_info, enrich_with_watch_url, get_similars
+from hubble.getters import get_search, get_similars
 from ai import get_name_by_description
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+# Send the card as soon as info arrives and add the ▶️ button when LordFilm answers
+PROGRESSIVE_CARDS = os.getenv("PROGRESSIVE_CARDS", "1").lower() not in ("0", "false", "no")
 
-# ─────────────────────────────────────────────────────────────────────────────
-# Helpers
-# ─────────────────────────────────────────────────────────────────────────────
+# Carousel neighbours warmed up in the background: idx-1 and idx+1..idx+PREFETCH_AHEAD
+PREFETCH_AHEAD = int(os.getenv("PREFETCH_AHEAD", "2"))
+_prefetch_slots = asyncio.Semaphore(int(os.getenv("PREFETCH_CONCURRENCY", "4")))
 
-def _get_lib_item(user_id: int, content_type: str, content_id: str) -> dict | None:
-    """Returns the user's library entry for this content, or None if not present."""
-    lib = get_user_lib(user_id, content_type)
-    return lib.get(str(content_id))
+INFO_UNAVAILABLE = "Не удалось загрузить данные, попробуй ещё раз чуть позже 🙁"
 
 
-async def _fetch_full_info(item: dict) -> dict:
-    """Fetches detailed info and enriches with watch_url. Returns merged dict."""
-    if item.get("typename") == "person":
-        return item
-    info = await get_info(item["typename"], item["id"])
-    merged = {**item, **info}
-    merged = await enrich_with_watch_url(merged)
-    return merged
-
+# ─────────────────────────────────────────────────────────────────────────────
+# Helpers
+# ─────────────────────────────────────────────────────────────────────────────
 
 def _build_results_list(first_item: dict, alternatives: list) -> list:
     """Returns a flat list of {id, typename} dicts: first item + alternatives."""
@@ -51,6 +49,117 @@ def _build_results_list(first_item: dict, alternatives: list) -> list:
     return results
 
 
+async def _patch_watch_button(
+    bot,
+    chat_id: int,
+    state: FSMContext,
+    message_id: int,
+    content_data: dict,
+    watch_pending: asyncio.Future,
+) -> None:
+    """Adds the ▶️ button to an already sent card once the LordFilm lookup resolves."""
+    try:
+        # Shielded: cancelling this patch (new search) must not cancel the shared
+        # lookup, whose result still goes to the catalog
+        watch_url = await asyncio.shield(watch_pending)
+    except Exception:
+        return
+    if not watch_url:
+        return
+
+    # The user may have paged away or started a new search meanwhile
+    data = await state.get_data()
+    if data.get("message_id") != message_id or data.get("idx", 0) != 0:
+        return
+
+    content_type, content_id = content_data["typename"], str(content_data["id"])
+    keyboard = build_card_keyboard(
+        content_type=content_type,
+        content_id=content_id,
+        lib_item=await get_lib_item(chat_id, content_type, content_id),
+        watch_url=watch_url,
+        idx=0,
+        total=len(data.get("results", [])),
+    )
+    try:
+        await bot.edit_message_reply_markup(chat_id=chat_id, message_id=message_id, reply_markup=keyboard)
+    except TelegramBadRequest:
+        return
+    await state.update_data(watch_url=watch_url)
+
+
+async def _prefetch_item(item: dict) -> None:
+    async with _prefetch_slots:
+        try:
+            await fetch_full_info(item)
+        except Exception:
+            logger.debug("Prefetch failed for %s", item, exc_info=True)
+
+
+def _prefetch_neighbours(chat_id: int, results: list, idx: int) -> None:
+    """
+    Warms the content catalog for the cards around idx, so paging doesn't wait on Hubble.
+    Prefetches for cards that fell out of the window are cancelled.
+    """
+    window = {}
+    if PREFETCH_AHEAD > 0:
+        for i in [idx + 1, idx - 1, *range(idx + 2, idx + PREFETCH_AHEAD + 1)]:
+            if 0 <= i < len(results):
+                window[f"{results[i]['typename']}:{results[i]['id']}"] = results[i]
+
+    chat_tasks.cancel(chat_id, "prefetch", keep=set(window))
+    already_running = chat_tasks.pending_names(chat_id, "prefetch")
+    for name, item in window.items():
+        if name not in already_running:
+            chat_tasks.spawn(chat_id, "prefetch", _prefetch_item(item), name=name)
+
+
+async def _start_search_carousel(bot, chat_id: int, state: FSMContext, results: list, first: dict) -> None:
+    """
+    Sends the first card of a search carousel and stores the carousel state.
+    In progressive mode the card does not wait for the LordFilm lookup.
+    """
+    chat_tasks.cancel(chat_id, "watch")  # pending patches belong to an older card
+    watch_pending = None
+    if PROGRESSIVE_CARDS:
+        content_data, watch_pending = await fetch_info_progressive(first)
+        if watch_pending is not None and watch_pending.done():
+            if not watch_pending.cancelled() and not watch_pending.exception() and watch_pending.result():
+                content_data["watch_url"] = watch_pending.result()
+            watch_pending = None
+    else:
+        content_data = await fetch_full_info(first)
+
+    lib_item = await get_lib_item(chat_id, content_data["typename"], str(content_data["id"]))
+    watch_url = content_data.get("watch_url") or content_data.get("url")
+    keyboard = build_card_keyboard(
+        content_type=content_data["typename"],
+        content_id=str(content_data["id"]),
+        lib_item=lib_item,
+        watch_url=watch_url,
+        idx=0,
+        total=len(results),
+    )
+
+    sent = await send_new_card(bot, chat_id, content_data, keyboard)
+
+    await state.set_state(SearchState.browsing)
+    await state.set_data({
+        "results": results,
+        "idx": 0,
+        "message_id": sent.message_id,
+        "watch_url": watch_url,
+    })
+
+    if watch_pending is not None:
+        chat_tasks.spawn(
+            chat_id,
+            "watch",
+            _patch_watch_button(bot, chat_id, state, sent.message_id, content_data, watch_pending),
+        )
+    _prefetch_neighbours(chat_id, results, 0)
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Search entry point — free text in any state
 # ─────────────────────────────────────────────────────────────────────────────
@@ -61,7 +170,11 @@ async def handle_search_query(message: types.Message, state: FSMContext):
     query = message.text.strip()
     if not is_search_query_valid(query):
         return
+    # A newer query from the same chat cancels this one (and vice versa)
+    await chat_tasks.run_exclusive(message.chat.id, "search", _run_search(message, state, query))
+
 
+async def _run_search(message: types.Message, state: FSMContext, query: str) -> None:
     try:
         search_data = await get_search(query)
     except Exception:
@@ -84,32 +197,12 @@ async def handle_search_query(message: types.Message, state: FSMContext):
 
     if not match:
         await message.answer(get_random_content_not_found())
+        chat_tasks.cancel(message.chat.id, "prefetch")
         await state.clear()
         return
 
-    content_data = await _fetch_full_info(match)
-    results = _build_results_list(content_data, alternatives)
-
-    lib_item = _get_lib_item(message.chat.id, content_data["typename"], str(content_data["id"]))
-    watch_url = content_data.get("watch_url") or content_data.get("url")
-    keyboard = build_card_keyboard(
-        content_type=content_data["typename"],
-        content_id=str(content_data["id"]),
-        lib_item=lib_item,
-        watch_url=watch_url,
-        idx=0,
-        total=len(results),
-    )
-
-    sent = await send_new_card(message.bot, message.chat.id, content_data, keyboard)
-
-    await state.set_state(SearchState.browsing)
-    await state.set_data({
-        "results": results,
-        "idx": 0,
-        "message_id": sent.message_id,
-        "watch_url": watch_url,
-    })
+    results = _build_results_list(match, alternatives)
+    await _start_search_carousel(message.bot, message.chat.id, state, results, match)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -118,9 +211,13 @@ async def handle_search_query(message: types.Message, state: FSMContext):
 
 @router.callback_query(F.data.in_({"snext", "sprev"}))
 async def handle_search_nav(callback: types.CallbackQuery, state: FSMContext):
+    await chat_tasks.run_exclusive(callback.message.chat.id, "search", _navigate(callback, state))
+    await callback.answer()
+
+
+async def _navigate(callback: types.CallbackQuery, state: FSMContext) -> None:
     data = await state.get_data()
     if not data:
-        await callback.answer()
         return
 
     results = data.get("results", [])
@@ -128,11 +225,10 @@ async def handle_search_nav(callback: types.CallbackQuery, state: FSMContext):
     new_idx = idx + (1 if callback.data == "snext" else -1)
 
     if not (0 <= new_idx < len(results)):
-        await callback.answer()
         return
 
-    content_data = await _fetch_full_info(results[new_idx])
-    lib_item = _get_lib_item(callback.message.chat.id, content_data["typename"], str(content_data["id"]))
+    content_data = await fetch_full_info(results[new_idx])
+    lib_item = await get_lib_item(callback.message.chat.id, content_data["typename"], str(content_data["id"]))
     watch_url = content_data.get("watch_url") or content_data.get("url")
     keyboard = build_card_keyboard(
         content_type=content_data["typename"],
@@ -145,7 +241,7 @@ async def handle_search_nav(callback: types.CallbackQuery, state: FSMContext):
 
     await edit_card_content(callback.message, content_data, keyboard)
     await state.update_data(idx=new_idx, watch_url=watch_url)
-    await callback.answer()
+    _prefetch_neighbours(callback.message.chat.id, results, new_idx)
 
 
 @router.callback_query(F.data == "noop")
@@ -168,7 +264,7 @@ async def _refresh_card_keyboard(
     results = data.get("results", [])
     idx = data.get("idx", 0)
     watch_url = data.get("watch_url")
-    lib_item = _get_lib_item(callback.message.chat.id, content_type, content_id)
+    lib_item = await get_lib_item(callback.message.chat.id, content_type, content_id)
     keyboard = build_card_keyboard(
         content_type=content_type,
         content_id=content_id,
@@ -188,12 +284,15 @@ async def handle_add(callback: types.CallbackQuery, state: FSMContext):
     _, content_type, content_id = callback.data.split(":")
     user_id = callback.message.chat.id
 
-    if is_content_in_user_lib(user_id, content_type, content_id):
+    if await is_content_in_user_lib(user_id, content_type, content_id):
         await callback.answer("Уже в списке!")
         return
 
-    content_data = await _fetch_full_info({"id": content_id, "typename": content_type})
-    save_content_to_user_lib(user_id, content_data)
+    content_data = await fetch_full_info({"id": content_id, "typename": content_type})
+    if not has_info(content_data):
+        await callback.answer(INFO_UNAVAILABLE, show_alert=True)
+        return
+    await save_content_to_user_lib(user_id, content_data)
     await callback.answer("Добавлено в список!")
     await _refresh_card_keyboard(callback, state, content_type, content_id)
 
@@ -204,11 +303,14 @@ async def handle_saw(callback: types.CallbackQuery, state: FSMContext):
     _, content_type, content_id = callback.data.split(":")
     user_id = callback.message.chat.id
 
-    if not is_content_in_user_lib(user_id, content_type, content_id):
-        content_data = await _fetch_full_info({"id": content_id, "typename": content_type})
-        save_content_to_user_lib(user_id, content_data)
+    if not await is_content_in_user_lib(user_id, content_type, content_id):
+        content_data = await fetch_full_info({"id": content_id, "typename": content_type})
+        if not has_info(content_data):
+            await callback.answer(INFO_UNAVAILABLE, show_alert=True)
+            return
+        await save_content_to_user_lib(user_id, content_data)
 
-    mark_viewed_only(user_id, content_type, content_id)
+    await mark_viewed_only(user_id, content_type, content_id)
     await callback.answer("Отмечено как просмотренное!")
     await _refresh_card_keyboard(callback, state, content_type, content_id)
 
@@ -216,7 +318,7 @@ async def handle_saw(callback: types.CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("viewed:"))
 async def handle_viewed(callback: types.CallbackQuery, state: FSMContext):
     _, content_type, content_id = callback.data.split(":")
-    mark_viewed_only(callback.message.chat.id, content_type, content_id)
+    await mark_viewed_only(callback.message.chat.id, content_type, content_id)
     await callback.answer("Отмечено как просмотренное!")
     await _refresh_card_keyboard(callback, state, content_type, content_id)
 
@@ -224,7 +326,7 @@ async def handle_viewed(callback: types.CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("del:"))
 async def handle_del(callback: types.CallbackQuery, state: FSMContext):
     _, content_type, content_id = callback.data.split(":")
-    delete_content_from_user_lib(callback.message.chat.id, content_type, content_id)
+    await delete_content_from_user_lib(callback.message.chat.id, content_type, content_id)
     await callback.answer("Удалено из списка!")
     await _refresh_card_keyboard(callback, state, content_type, content_id)
 
@@ -237,12 +339,12 @@ async def handle_rec(callback: types.CallbackQuery, state: FSMContext):
     recommend = value == "1"
 
     # No-op if already set to same value
-    lib_item = _get_lib_item(user_id, content_type, content_id)
+    lib_item = await get_lib_item(user_id, content_type, content_id)
     if lib_item and lib_item.get("recommend") == recommend:
         await callback.answer()
         return
 
-    set_recommend_status(user_id, content_type, content_id, recommend)
+    await set_recommend_status(user_id, content_type, content_id, recommend)
     await callback.answer("👍 Советую ✓" if recommend else "👎 Не советую ✓")
     await _refresh_card_keyboard(callback, state, content_type, content_id)
 
@@ -255,7 +357,14 @@ async def handle_rec(callback: types.CallbackQuery, state: FSMContext):
 async def handle_similars(callback: types.CallbackQuery, state: FSMContext):
     _, content_type, content_id = callback.data.split(":")
     await callback.answer("Ищу похожее...")
+    await chat_tasks.run_exclusive(
+        callback.message.chat.id, "search", _show_similars(callback, state, content_type, content_id)
+    )
 
+
+async def _show_similars(
+    callback: types.CallbackQuery, state: FSMContext, content_type: str, content_id: str
+) -> None:
     similars = await get_similars(content_type, content_id)
     if not similars:
         await callback.message.answer("Похожих не нашёл 😔")
@@ -270,24 +379,4 @@ async def handle_similars(callback: types.CallbackQuery, state: FSMContext):
         await callback.message.answer("Похожих не нашёл 😔")
         return
 
-    content_data = await _fetch_full_info(results[0])
-    lib_item = _get_lib_item(callback.message.chat.id, content_data["typename"], str(content_data["id"]))
-    watch_url = content_data.get("watch_url") or content_data.get("url")
-    keyboard = build_card_keyboard(
-        content_type=content_data["typename"],
-        content_id=str(content_data["id"]),
-        lib_item=lib_item,
-        watch_url=watch_url,
-        idx=0,
-        total=len(results),
-    )
-
-    sent = await send_new_card(callback.message.bot, callback.message.chat.id, content_data, keyboard)
-
-    await state.set_state(SearchState.browsing)
-    await state.set_data({
-        "results": results,
-        "idx": 0,
-        "message_id": sent.message_id,
-        "watch_url": watch_url,
-    })
+    await _start_search_carousel(callback.message.bot, callback.message.chat.id, state, results, results[0])
@@ -2,6 +2,7 @@ from aiogram import types, Router
 from aiogram.filters import Command
 
 from bot.keyboards import build_main_menu
+from bot.helpers.tasks import chat_tasks
 
 router = Router()
 
@@ -17,4 +18,5 @@ START_MESSAGE = """<b>Привет, я КиноЛиба! 👋</b>
 
 @router.message(Command("start"))
 async def send_welcome(message: types.Message):
+    chat_tasks.cancel(message.chat.id, "prefetch")  # left the search carousel
     await message.answer(START_MESSAGE, parse_mode="HTML", reply_markup=build_main_menu())
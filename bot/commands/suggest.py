@@ -8,9 +8,11 @@ from bot.states import SearchState, SuggestState
 from bot.keyboards.suggest import build_suggest_keyboard
 from bot.keyboards import build_card_keyboard, build_library_keyboard
 from bot.helpers.send import send_new_card
+from bot.helpers.content import fetch_full_info, refresh_in_background
+from bot.helpers.tasks import chat_tasks
 from bot.conversation.messages_creator.library import create_library_message
-from bot.data import get_filtered_lib, get_user_lib
-from hubble.getters import get_search, get_info, enrich_with_watch_url
+from bot.data.aio import get_lib_page, get_lib_position, get_lib_total, get_lib_item
+from hubble.getters import get_search
 from ai import suggest_by_mood, suggest_random
 
 logger = logging.getLogger(__name__)
@@ -23,6 +25,7 @@ router = Router()
 
 @router.message(F.text == "🎲 Что посмотреть?")
 async def suggest_menu(message: types.Message):
+    chat_tasks.cancel(message.chat.id, "prefetch")  # left the search carousel
     await message.answer("Чего душа просит? 🤔", reply_markup=build_suggest_keyboard())
 
 
@@ -33,24 +36,27 @@ async def suggest_menu(message: types.Message):
 @router.callback_query(F.data == "sug:lib")
 async def suggest_from_library(callback: types.CallbackQuery):
     chat_id = callback.message.chat.id
-
-    items = get_filtered_lib(chat_id, "unseen")
-    if not items:
-        items = get_filtered_lib(chat_id, "all")
-    if not items:
+    chat_tasks.cancel(chat_id, "prefetch")
+
+    # Pick a random position instead of copying the whole filtered list;
+    # only the chosen item is joined with its catalog payload
+    item = None
+    total = await get_lib_total(chat_id, "all")
+    for filter_key in ("unseen", "all"):
+        count = total if filter_key == "all" else await get_lib_total(chat_id, filter_key)
+        if count:
+            item, _, _ = await get_lib_page(chat_id, filter_key, random.randrange(count))
+            break
+    if item is None:
         await callback.answer(
             "Библиотека пустая! Добавь что-нибудь через поиск.", show_alert=True
         )
         return
 
-    item = random.choice(items)
-    all_items = get_filtered_lib(chat_id, "all")
-    idx = next(
-        (i for i, x in enumerate(all_items) if str(x.get("id")) == str(item.get("id"))),
-        0,
-    )
+    idx = await get_lib_position(chat_id, "all", item.get("typename"), item.get("id")) or 0
+    refresh_in_background(chat_id, item)
     caption = create_library_message(item)
-    keyboard = build_library_keyboard(item, idx=idx, total=len(all_items), current_filter="all")
+    keyboard = build_library_keyboard(item, idx=idx, total=total, current_filter="all")
     poster = item.get("kinopoisk_poster_url") or item.get("poster_url")
 
     if poster:
@@ -79,6 +85,7 @@ async def suggest_from_library(callback: types.CallbackQuery):
 
 @router.callback_query(F.data == "sug:mood")
 async def suggest_mood_start(callback: types.CallbackQuery, state: FSMContext):
+    chat_tasks.cancel(callback.message.chat.id, "prefetch")
     await callback.message.answer(
         "Опиши что хочется — жанр, эпоха, настроение.\n"
         "<i>Например: «боевичок с юмором» или «что-нибудь душевное на вечер»</i>",
@@ -92,7 +99,9 @@ async def suggest_mood_start(callback: types.CallbackQuery, state: FSMContext):
 async def suggest_mood_result(message: types.Message, state: FSMContext):
     mood = message.text.strip()
     await state.clear()
-    await _find_via_ai(message.bot, message.chat.id, state, suggest_by_mood, mood)
+    await chat_tasks.run_exclusive(
+        message.chat.id, "search", _find_via_ai(message.bot, message.chat.id, state, suggest_by_mood, mood)
+    )
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -101,8 +110,13 @@ async def suggest_mood_result(message: types.Message, state: FSMContext):
 
 @router.callback_query(F.data == "sug:random")
 async def suggest_random_handler(callback: types.CallbackQuery, state: FSMContext):
+    chat_tasks.cancel(callback.message.chat.id, "prefetch")
     await callback.answer("Подбираю...")
-    await _find_via_ai(callback.message.bot, callback.message.chat.id, state, suggest_random)
+    await chat_tasks.run_exclusive(
+        callback.message.chat.id,
+        "search",
+        _find_via_ai(callback.message.bot, callback.message.chat.id, state, suggest_random),
+    )
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -130,12 +144,9 @@ async def _find_via_ai(bot, chat_id: int, state: FSMContext, ai_func, *args) ->
         )
         return
 
-    if match.get("typename") != "person":
-        info = await get_info(match["typename"], match["id"])
-        match = {**match, **info}
-    match = await enrich_with_watch_url(match)
+    match = await fetch_full_info(match)
 
-    lib_item = get_user_lib(chat_id, match["typename"]).get(str(match.get("id")))
+    lib_item = await get_lib_item(chat_id, match["typename"], match.get("id"))
     watch_url = match.get("watch_url") or match.get("url")
     results = [{"id": str(match["id"]), "typename": match["typename"]}] + [
         {"id": str(m.get("id")), "typename": m.get("typename")} for m in alternatives
@@ -1,11 +1,18 @@
 from bot.data.handler import get_token
 from bot.data.handler import get_passphrase
 from bot.data.handler import get_user_lib
+from bot.data.handler import get_lib_item
+from bot.data.handler import join_catalog
 from bot.data.handler import get_users_recommends
 from bot.data.handler import is_content_in_user_lib
 from bot.data.handler import save_content_to_user_lib
 from bot.data.handler import is_this_content_already_recommend
+from bot.data.handler import get_recommend_ids
 from bot.data.handler import delete_content_from_user_lib
 from bot.data.handler import get_filtered_lib
+from bot.data.handler import get_lib_page
+from bot.data.handler import get_lib_position
+from bot.data.handler import get_lib_total
 from bot.data.handler import mark_viewed_only
 from bot.data.handler import set_recommend_status
+from bot.data.handler import user_library
@@ -0,0 +1,153 @@
+import os
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+
+from bot.data import handler
+from bot.data.locks import user_locks
+
+# Async counterparts of the bot.data library functions. Disk work runs in a
+# dedicated pool so parsing a big library never stalls other chats.
+STORAGE_WORKERS = int(os.getenv("STORAGE_WORKERS", "4"))
+
+_executor = ThreadPoolExecutor(max_workers=STORAGE_WORKERS, thread_name_prefix="storage")
+
+
+async def _run(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def _run_locked(conversation_id: int, func, *args, **kwargs):
+    """
+    _run for library mutations: one at a time per user, so concurrent
+    callbacks can't overwrite each other's read-modify-write.
+    """
+    async with user_locks.hold(conversation_id):
+        return await _run_shielded(func, conversation_id, *args, **kwargs)
+
+
+async def _run_shielded(func, *args, **kwargs):
+    """_run for work done under a user lock: a cancelled caller still waits for the worker."""
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # The worker thread can't be stopped: keep the user locked until it is done
+        await asyncio.wait([future])
+        raise
+
+
+def shutdown() -> None:
+    """Waits for pending storage work and stops the pool."""
+    _executor.shutdown(wait=True)
+
+
+@asynccontextmanager
+async def user_library(conversation_id: int) -> AsyncIterator[handler.UserLibrary]:
+    """
+    async with user_library(chat_id) as lib: ... — async twin of
+    handler.user_library. The library is loaded up front and committed on
+    exit in the storage pool, so reads inside the block never hit the disk
+    on the event loop. Holds the user's library lock throughout: don't call
+    the mutating functions below for the same user inside.
+    """
+    async with user_locks.hold(conversation_id):
+        lib = await _run_shielded(lambda: handler.open_user_library(conversation_id).load())
+        yield lib
+        await _run_shielded(lib.commit)
+
+
+async def get_user_lib(conversation_id: int, content_type: str = None) -> dict:
+    return await _run(handler.get_user_lib, conversation_id, content_type)
+
+
+async def get_lib_item(conversation_id: int, content_type: str, content_id: int) -> dict | None:
+    return await _run(handler.get_lib_item, conversation_id, content_type, content_id)
+
+
+async def is_content_in_user_lib(conversation_id: int, content_type: str, content_id: int) -> bool:
+    return await _run(handler.is_content_in_user_lib, conversation_id, content_type, content_id)
+
+
+async def save_content_to_user_lib(conversation_id: int, content_data: dict) -> bool:
+    return await _run_locked(conversation_id, handler.save_content_to_user_lib, content_data)
+
+
+async def update_content_in_user_lib(conversation_id: int, content_data: dict) -> bool:
+    return await _run_locked(conversation_id, handler.update_content_in_user_lib, content_data)
+
+
+async def delete_content_from_user_lib(conversation_id: int, content_type: str, content_id: int) -> bool:
+    return await _run_locked(conversation_id, handler.delete_content_from_user_lib, content_type, content_id)
+
+
+async def mark_as_viewed(
+    conversation_id: int, content_type: str, content_id: int, recommend: bool = False
+) -> bool:
+    return await _run_locked(conversation_id, handler.mark_as_viewed, content_type, content_id, recommend)
+
+
+async def get_users_recommends(conversation_id: int) -> dict[str:list]:
+    return await _run(handler.get_users_recommends, conversation_id)
+
+
+async def is_this_content_already_recommend(conversation_id: int, content_type: str, content_id: int) -> bool:
+    return await _run(handler.is_this_content_already_recommend, conversation_id, content_type, content_id)
+
+
+async def get_library_titles(content_type: str) -> dict[str, str]:
+    return await _run(handler.get_library_titles, content_type)
+
+
+async def get_content_holders(content_type: str, content_ids) -> dict[int, set[str]]:
+    return await _run(handler.get_content_holders, content_type, list(content_ids))
+
+
+async def get_recommend_ids(conversation_id: int, recommend: bool = True) -> dict[str, set[str]]:
+    return await _run(handler.get_recommend_ids, conversation_id, recommend)
+
+
+async def mark_as_recommend(
+    conversation_id: int,
+    content_type: str,
+    content_id: int,
+    recommend: bool,
+    user_review: str = "",
+) -> bool:
+    return await _run_locked(
+        conversation_id, handler.mark_as_recommend, content_type, content_id, recommend, user_review
+    )
+
+
+async def get_filtered_lib(conversation_id: int, filter_key: str = "all") -> list:
+    return await _run(handler.get_filtered_lib, conversation_id, filter_key)
+
+
+async def get_lib_page(
+    conversation_id: int, filter_key: str = "all", idx: int = 0
+) -> tuple[dict | None, int, int]:
+    return await _run(handler.get_lib_page, conversation_id, filter_key, idx)
+
+
+async def get_lib_total(conversation_id: int, filter_key: str = "all") -> int:
+    return await _run(handler.get_lib_total, conversation_id, filter_key)
+
+
+async def get_lib_position(
+    conversation_id: int, filter_key: str, content_type: str, content_id: int
+) -> int | None:
+    return await _run(handler.get_lib_position, conversation_id, filter_key, content_type, content_id)
+
+
+async def mark_viewed_only(conversation_id: int, content_type: str, content_id: int) -> bool:
+    return await _run_locked(conversation_id, handler.mark_viewed_only, content_type, content_id)
+
+
+async def set_recommend_status(
+    conversation_id: int, content_type: str, content_id: int, recommend: bool
+) -> bool:
+    return await _run_locked(conversation_id, handler.set_recommend_status, content_type, content_id, recommend)
@@ -0,0 +1,271 @@
+"""
+Offline micro-benchmark of the library storage layer.
+
+    python -m bot.data.bench                                 # full run, report to bench_report.json
+    python -m bot.data.bench --sizes 10,100 --repeat 5       # quick run
+    python -m bot.data.bench --compare old_report.json       # print ratios against an earlier report
+
+Synthetic users with 10 / 100 / 1,000 / 10,000 get_info-shaped titles are
+created in a temporary directory (library and content catalog alike), so
+real data and the network are never touched. Every backend x cache
+combination times the public bot.data functions and the results are
+written as JSON.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from typing import Callable
+
+from bot.data import handler
+from bot.data.catalog import content_catalog
+from bot.data.storage import CachedStorage, JsonStorage, SqliteStorage, LIBRARY_FILTERS
+from bot.data.storage import serialization
+
+DEFAULT_SIZES = (10, 100, 1_000, 10_000)
+BACKENDS = ("sqlite", "json")
+SEED = 1984
+
+_GENRES = ["драма", "комедия", "триллер", "фантастика", "боевик", "мелодрама", "ужасы", "криминал"]
+_COUNTRIES = ["США", "Россия", "Великобритания", "Франция", "Южная Корея", "Япония"]
+_WORDS = ["тёмный", "город", "ночь", "последний", "дом", "путь", "море", "тайна", "звезда", "война"]
+
+
+def make_payload(rng: random.Random, content_id: int) -> dict:
+    """A title shaped like a hubble get_info answer."""
+    typename = rng.choice(("film", "tvseries"))
+    title = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 3))).capitalize()
+    year = rng.randint(1960, 2025)
+    payload = {
+        "id": content_id,
+        "typename": typename,
+        "title_russian": f"{title} {content_id}",
+        "title_original": f"Title {content_id}",
+        "description": " ".join(rng.choice(_WORDS) for _ in range(rng.randint(40, 90))),
+        "genres": [{"name": name} for name in rng.sample(_GENRES, 3)],
+        "countries": [{"name": name} for name in rng.sample(_COUNTRIES, 2)],
+        "rating_kinopoisk": round(rng.uniform(4, 9), 3),
+        "rating_imdb": round(rng.uniform(4, 9), 1),
+        "kinopoisk_poster_url": f"https://avatars.mds.yandex.net/get-kinopoisk-image/{content_id}/orig",
+        "persons": [
+            {"name": f"Актёр {rng.randint(1, 5000)}", "role": rng.choice(("actor", "director"))}
+            for _ in range(rng.randint(5, 15))
+        ],
+    }
+    if typename == "film":
+        payload["production_year"] = year
+        payload["duration"] = rng.randint(80, 180)
+    else:
+        payload["release_start"] = year
+        payload["release_end"] = year + rng.randint(0, 8)
+        payload["seasons_count"] = rng.randint(1, 8)
+    return payload
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _summary(samples: list[float]) -> dict:
+    ms = sorted(sample * 1000 for sample in samples)
+    return {
+        "runs": len(ms),
+        "min_ms": round(ms[0], 4),
+        "median_ms": round(statistics.median(ms), 4),
+        "mean_ms": round(statistics.fmean(ms), 4),
+        "max_ms": round(ms[-1], 4),
+    }
+
+
+def _time(func: Callable, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+class Bench:
+    def __init__(self, workdir: str, payloads: list[dict], args):
+        self.workdir = workdir
+        self.payloads = payloads
+        self.args = args
+        self.results: list[dict] = []
+
+    def _storage(self, backend: str, cached: bool):
+        path = os.path.join(self.workdir, backend)
+        if backend == "sqlite":
+            storage = SqliteStorage(path + ".sqlite3", fsync=self.args.fsync)
+        else:
+            storage = JsonStorage(path, fsync=self.args.fsync, codec=self.args.format)
+        if cached:
+            storage = CachedStorage(storage, max_users=handler.LIBRARY_CACHE_USERS, flush_delay=handler.LIBRARY_FLUSH_DELAY)
+        return storage
+
+    def _populate(self, storage, user_id: int, size: int) -> None:
+        # One batch instead of `size` saves: the json backend would rewrite the file every time
+        upserts = {
+            (payload["typename"], str(payload["id"])): handler.library_entry(payload)
+            for payload in self.payloads[:size]
+        }
+        rng = random.Random(SEED + size)
+        for entry in upserts.values():
+            entry["viewed"] = rng.random() < 0.5
+            entry["recommend"] = rng.choice((None, True, False)) if entry["viewed"] else None
+        storage.apply_changes(user_id, upserts)
+
+    def _record(self, backend: str, cached: bool, size: int, op: str, samples: list[float]) -> None:
+        self.results.append(
+            {"backend": backend, "cache": cached, "size": size, "op": op, **_summary(samples)}
+        )
+
+    def run_case(self, backend: str, cached: bool, size: int) -> None:
+        user_id = size
+        repeat = self.args.repeat
+        rng = random.Random(SEED)
+        keys = [(payload["typename"], payload["id"]) for payload in self.payloads[:size]]
+
+        seed_storage = self._storage(backend, cached=False)
+        self._populate(seed_storage, user_id, size)
+        seed_storage.close()
+        storage = self._storage(backend, cached)
+        handler.set_storage(storage)
+        try:
+            # First read of a fresh storage: parse / cache fill
+            self._record(backend, cached, size, "cold:get_filtered_lib[all]",
+                         [_time(handler.get_filtered_lib, user_id, "all")])
+
+            for filter_key in LIBRARY_FILTERS:
+                self._record(backend, cached, size, f"get_filtered_lib[{filter_key}]",
+                             [_time(handler.get_filtered_lib, user_id, filter_key) for _ in range(repeat)])
+            self._record(backend, cached, size, "get_lib_page[all]", [
+                _time(handler.get_lib_page, user_id, "all", rng.randrange(size)) for _ in range(repeat)
+            ])
+            self._record(backend, cached, size, "get_users_recommends",
+                         [_time(handler.get_users_recommends, user_id) for _ in range(repeat)])
+            self._record(backend, cached, size, "is_content_in_user_lib",
+                         [_time(handler.is_content_in_user_lib, user_id, *rng.choice(keys)) for _ in range(repeat)])
+            self._record(backend, cached, size, "mark_viewed_only",
+                         [_time(handler.mark_viewed_only, user_id, *rng.choice(keys)) for _ in range(repeat)])
+            self._record(backend, cached, size, "set_recommend_status", [
+                _time(handler.set_recommend_status, user_id, *rng.choice(keys), rng.random() < 0.5)
+                for _ in range(repeat)
+            ])
+
+            extra = self.payloads[size:size + repeat]
+            self._record(backend, cached, size, "save_content_to_user_lib",
+                         [_time(handler.save_content_to_user_lib, user_id, payload) for payload in extra])
+            self._record(backend, cached, size, "delete_content_from_user_lib", [
+                _time(handler.delete_content_from_user_lib, user_id, payload["typename"], payload["id"])
+                for payload in extra
+            ])
+            # Pending write-back of the cached variants lands here
+            self._record(backend, cached, size, "close", [_time(handler.close_storage)])
+        finally:
+            handler.close_storage()
+        # Next case starts from an empty backend
+        for name in os.listdir(self.workdir):
+            if name.startswith(backend) and name != "catalog.sqlite3":
+                target = os.path.join(self.workdir, name)
+                shutil.rmtree(target) if os.path.isdir(target) else os.unlink(target)
+
+
+def compare(report: dict, baseline: dict) -> None:
+    def key(row):
+        return row["backend"], row["cache"], row["size"], row["op"]
+
+    old = {key(row): row for row in baseline["results"]}
+    print(f"{'backend':8} {'cache':5} {'size':>6} {'op':34} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    for row in report["results"]:
+        before = old.get(key(row))
+        if before is None:
+            continue
+        ratio = row["median_ms"] / before["median_ms"] if before["median_ms"] else float("nan")
+        print(
+            f"{row['backend']:8} {str(row['cache']):5} {row['size']:>6} {row['op']:34} "
+            f"{before['median_ms']:>10.3f} {row['median_ms']:>10.3f} {ratio:>6.2f}x"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bot.data.bench", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="library sizes (default: %(default)s)")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="default: %(default)s")
+    parser.add_argument("--cache", default="on,off", help="cache variants: on, off or both (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per operation (default: %(default)s)")
+    parser.add_argument("--format", default=handler.LIBRARY_FORMAT, choices=sorted(serialization.CODECS), help="json backend file format")
+    parser.add_argument("--no-fsync", dest="fsync", action="store_false", help="skip fsync (measures CPU rather than the disk)")
+    parser.add_argument("--out", default="bench_report.json", help="report path (default: %(default)s)")
+    parser.add_argument("--compare", metavar="REPORT", help="earlier report to print ratios against")
+    args = parser.parse_args(argv)
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    backends = [backend for backend in args.backends.split(",") if backend]
+    caches = [variant == "on" for variant in args.cache.split(",") if variant in ("on", "off")]
+    for backend in backends:
+        if backend not in BACKENDS:
+            parser.error(f"unknown backend {backend!r}")
+
+    rng = random.Random(SEED)
+    payloads = [make_payload(rng, content_id) for content_id in range(1, sizes[-1] + args.repeat + 1)]
+
+    workdir = tempfile.mkdtemp(prefix="kinoliba-bench-")
+    # Point the shared catalog at the sandbox before anything opens it
+    content_catalog.close()
+    content_catalog.path = os.path.join(workdir, "catalog.sqlite3")
+    try:
+        for payload in payloads:
+            content_catalog.put(payload["typename"], payload["id"], payload)
+        bench = Bench(workdir, payloads, args)
+        for backend in backends:
+            for cached in caches:
+                for size in sizes:
+                    started = time.perf_counter()
+                    bench.run_case(backend, cached, size)
+                    print(
+                        f"{backend:6} cache={'on ' if cached else 'off'} size={size:<6} "
+                        f"{time.perf_counter() - started:6.2f}s",
+                        file=sys.stderr,
+                    )
+    finally:
+        content_catalog.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "orjson": serialization.orjson is not None,
+            "format": args.format,
+            "fsync": args.fsync,
+            "repeat": args.repeat,
+            "flush_delay": handler.LIBRARY_FLUSH_DELAY,
+            "seed": SEED,
+        },
+        "results": bench.results,
+    }
+    with open(args.out, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Report written to {args.out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            compare(report, json.load(file))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from typing import Iterable, NamedTuple, Optional
+
+from bot.data.handler import DATA_PATH
+
+CALENDAR_PATH = os.getenv("CALENDAR_PATH", DATA_PATH + "calendar.sqlite3")
+
+
+class CalendarEntry(NamedTuple):
+    series_id: str
+    title: str
+    next_date: Optional[str]  # as Hubble reports it: "2025-03-14", "2025-00-00" or "2025"
+    next_season_in_prod: bool
+    production_year: Optional[str]
+    fetched_at: Optional[float]  # None: registered, never fetched
+    next_refresh: float
+    failures: int = 0
+
+
+class ReleaseCalendar:
+    """
+    One shared, deduplicated release calendar: the next episode date of every
+    series found in any library, keyed by series id. Filled and refreshed by
+    the release scheduler (bot.helpers.release_calendar); /dates only reads it.
+    """
+
+    def __init__(self, path: str = CALENDAR_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS calendar (
+                    series_id           TEXT PRIMARY KEY,
+                    title               TEXT NOT NULL,
+                    next_date           TEXT,
+                    next_season_in_prod INTEGER NOT NULL DEFAULT 0,
+                    production_year     TEXT,
+                    fetched_at          REAL,
+                    next_refresh        REAL NOT NULL,
+                    failures            INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS calendar_due ON calendar (next_refresh)")
+            conn.execute("CREATE INDEX IF NOT EXISTS calendar_next_date ON calendar (next_date)")
+            if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                # Earlier versions stored a failed lookup ({} from Hubble) as a finished show
+                # with nothing else known; make such entries due once so they get a real answer
+                conn.execute(
+                    "UPDATE calendar SET next_refresh = 0 WHERE fetched_at IS NOT NULL AND next_date IS NULL "
+                    "AND next_season_in_prod = 0 AND production_year IS NULL"
+                )
+                conn.execute("PRAGMA user_version = 1")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _entry(row) -> CalendarEntry:
+        return CalendarEntry(row[0], row[1], row[2], bool(row[3]), row[4], row[5], row[6], row[7])
+
+    def get_many(self, series_ids: Iterable[str]) -> dict[str, CalendarEntry]:
+        ids = sorted({str(series_id) for series_id in series_ids})
+        rows = []
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(ids), 400):
+                chunk = ids[start:start + 400]
+                rows += conn.execute(
+                    f"SELECT * FROM calendar WHERE series_id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+        return {row[0]: self._entry(row) for row in rows}
+
+    def register(self, series: dict[str, str]) -> int:
+        """Adds unknown series ({series_id: title}) as due right away. Returns how many were new."""
+        with self._lock:
+            conn = self._connect()
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO calendar (series_id, title, next_refresh) VALUES (?, ?, 0)",
+                [(str(series_id), title) for series_id, title in series.items()],
+            )
+            conn.commit()
+            return conn.total_changes - before
+
+    def forget_except(self, series_ids: Iterable[str]) -> int:
+        """Drops series not in series_ids (no longer in any library). Returns how many."""
+        keep = {str(series_id) for series_id in series_ids}
+        with self._lock:
+            conn = self._connect()
+            gone = [(sid,) for (sid,) in conn.execute("SELECT series_id FROM calendar") if sid not in keep]
+            conn.executemany("DELETE FROM calendar WHERE series_id = ?", gone)
+            conn.commit()
+        return len(gone)
+
+    def put(self, entry: CalendarEntry) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO calendar VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry.series_id, entry.title, entry.next_date, int(entry.next_season_in_prod),
+                 entry.production_year, entry.fetched_at, entry.next_refresh, entry.failures),
+            )
+            conn.commit()
+
+    def postpone(self, series_id: str, next_refresh: float) -> None:
+        """Failed refresh: keep the old data, try again at next_refresh."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE calendar SET next_refresh = ?, failures = failures + 1 WHERE series_id = ?",
+                (next_refresh, str(series_id)),
+            )
+            conn.commit()
+
+    def due(self, now: Optional[float] = None, limit: int = 50) -> list[CalendarEntry]:
+        """Series whose refresh time has come, most overdue first."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT * FROM calendar WHERE next_refresh <= ? ORDER BY next_refresh LIMIT ?",
+                (time.time() if now is None else now, limit),
+            ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def released_on(self, day: str) -> list[CalendarEntry]:
+        """Series whose next episode comes out on day ("YYYY-MM-DD")."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT * FROM calendar WHERE next_date = ?", (day,)
+            ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # Async wrappers: keep sqlite I/O off the event loop
+
+    async def aget_many(self, series_ids: Iterable[str]) -> dict[str, CalendarEntry]:
+        return await asyncio.to_thread(self.get_many, list(series_ids))
+
+    async def aregister(self, series: dict[str, str]) -> int:
+        return await asyncio.to_thread(self.register, series)
+
+    async def aforget_except(self, series_ids: Iterable[str]) -> int:
+        return await asyncio.to_thread(self.forget_except, list(series_ids))
+
+    async def aput(self, entry: CalendarEntry) -> None:
+        await asyncio.to_thread(self.put, entry)
+
+    async def apostpone(self, series_id: str, next_refresh: float) -> None:
+        await asyncio.to_thread(self.postpone, series_id, next_refresh)
+
+    async def areleased_on(self, day: str) -> list[CalendarEntry]:
+        return await asyncio.to_thread(self.released_on, day)
+
+    async def adue(self, now: Optional[float] = None, limit: int = 50) -> list[CalendarEntry]:
+        return await asyncio.to_thread(self.due, now, limit)
+
+
+release_calendar = ReleaseCalendar()
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Iterable, NamedTuple, Optional
+
+from bot.data.handler import DATA_PATH
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", DATA_PATH + "catalog.sqlite3")
+# get_info payloads older than this are refetched from Hubble (stale copy is the fallback)
+CATALOG_MAX_AGE = float(os.getenv("CATALOG_MAX_AGE", str(7 * 24 * 3600)))
+# SQLite caps host parameters per statement, so batch lookups are chunked
+_BATCH = 400
+
+
+class CatalogEntry(NamedTuple):
+    payload: dict
+    fetched_at: float
+
+
+class ContentCatalog:
+    """
+    SQLite-backed store of enriched get_info payloads keyed by (typename, id).
+    Film metadata barely changes, so it survives restarts and is only
+    refreshed once an entry is older than max_age.
+    It is also the one shared copy of every title kept in user libraries:
+    library entries only reference it, so entries are never dropped by age.
+    """
+
+    def __init__(self, path: str = CATALOG_PATH, max_age: float = CATALOG_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS content (
+                    typename   TEXT NOT NULL,
+                    id         TEXT NOT NULL,
+                    payload    TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (typename, id)
+                )
+                """
+            )
+            self._conn = conn
+        return self._conn
+
+    def is_fresh(self, entry: CatalogEntry) -> bool:
+        return time.time() - entry.fetched_at < self.max_age
+
+    def get(self, typename: str, id) -> Optional[CatalogEntry]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT payload, fetched_at FROM content WHERE typename = ? AND id = ?",
+                (typename, str(id)),
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return CatalogEntry(json.loads(row[0]), row[1])
+        except json.JSONDecodeError:
+            logger.warning("Corrupt catalog entry %s:%s, dropping it", typename, id)
+            self.delete(typename, id)
+            return None
+
+    def get_many(self, keys: Iterable[tuple[str, str]]) -> dict[tuple[str, str], CatalogEntry]:
+        """Batch get(): {(typename, id): entry} for the keys that are in the catalog."""
+        by_type: dict[str, set[str]] = {}
+        for typename, id in keys:
+            by_type.setdefault(typename, set()).add(str(id))
+
+        rows = []
+        with self._lock:
+            conn = self._connect()
+            for typename, ids in by_type.items():
+                ids = sorted(ids)
+                for start in range(0, len(ids), _BATCH):
+                    chunk = ids[start:start + _BATCH]
+                    rows += conn.execute(
+                        "SELECT typename, id, payload, fetched_at FROM content "
+                        f"WHERE typename = ? AND id IN ({','.join('?' * len(chunk))})",
+                        (typename, *chunk),
+                    ).fetchall()
+
+        entries = {}
+        for typename, id, payload, fetched_at in rows:
+            try:
+                entries[(typename, id)] = CatalogEntry(json.loads(payload), fetched_at)
+            except json.JSONDecodeError:
+                logger.warning("Corrupt catalog entry %s:%s, skipping it", typename, id)
+        return entries
+
+    def put(self, typename: str, id, payload: dict, fetched_at: Optional[float] = None) -> None:
+        self._insert("INSERT OR REPLACE", typename, id, payload, fetched_at)
+
+    def put_if_absent(self, typename: str, id, payload: dict, fetched_at: Optional[float] = None) -> None:
+        """Stores payload unless the title is already known (fetched_at=0 marks it stale)."""
+        self._insert("INSERT OR IGNORE", typename, id, payload, fetched_at)
+
+    def _insert(self, verb: str, typename: str, id, payload: dict, fetched_at: Optional[float]) -> None:
+        data = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        if fetched_at is None:
+            fetched_at = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                f"{verb} INTO content (typename, id, payload, fetched_at) VALUES (?, ?, ?, ?)",
+                (typename, str(id), data, fetched_at),
+            )
+            conn.commit()
+
+    def delete(self, typename: str, id) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "DELETE FROM content WHERE typename = ? AND id = ?", (typename, str(id))
+            )
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # Async wrappers: keep sqlite I/O off the event loop
+
+    async def aget(self, typename: str, id) -> Optional[CatalogEntry]:
+        return await asyncio.to_thread(self.get, typename, id)
+
+    async def aput(self, typename: str, id, payload: dict, fetched_at: Optional[float] = None) -> None:
+        await asyncio.to_thread(self.put, typename, id, payload, fetched_at)
+
+
+content_catalog = ContentCatalog()
@@ -0,0 +1,114 @@
+"""
+Bulk conversion and verification of user library files (the json backend).
+
+    python -m bot.data.convert --to compact             # convert bot/data/users/
+    python -m bot.data.convert --to msgpack --dry-run   # only measure
+    python -m bot.data.convert --verify                 # check that every file parses
+
+Reports total size and parse time before/after. Exit code 1 if any file
+fails to parse or round-trip.
+"""
+import os
+import sys
+import time
+import argparse
+from collections import Counter
+
+from bot.data.handler import USER_DATA_PATH, LIBRARY_FORMAT
+from bot.data.storage import JsonStorage, SerializationError, CODECS, get_codec, encode, decode
+from bot.data.storage.serialization import detect
+
+
+def _parse_time(raw: bytes, repeat: int) -> float:
+    """Best of `repeat` decode() runs, seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        decode(raw)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _fmt_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024 or unit == "MB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _ratio(after: float, before: float) -> str:
+    return f"{after / before:.2f}x" if before else "-"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bot.data.convert", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dir", default=USER_DATA_PATH, help="library directory (default: %(default)s)")
+    parser.add_argument("--to", default=LIBRARY_FORMAT, choices=sorted(CODECS), help="target format (default: LIBRARY_FORMAT)")
+    parser.add_argument("--dry-run", action="store_true", help="measure and verify, write nothing")
+    parser.add_argument("--verify", action="store_true", help="only check that every file parses")
+    parser.add_argument("--repeat", type=int, default=5, help="parse timing runs per file (best is taken)")
+    args = parser.parse_args(argv)
+
+    try:
+        target = get_codec(args.to)
+    except RuntimeError as e:
+        parser.error(str(e))
+
+    storage = JsonStorage(args.dir, fsync=True, codec=target.name)
+    formats = Counter()
+    failures = []
+    size_before = size_after = 0
+    parse_before = parse_after = 0.0
+    converted = 0
+
+    for user_id in storage.user_ids():
+        path = storage.user_file(user_id)
+        with open(path, "rb") as file:
+            raw = file.read()
+        try:
+            source = detect(raw)
+            data = decode(raw)
+        except SerializationError as e:
+            failures.append(f"{path}: {e}")
+            continue
+        formats[source.name] += 1
+        size_before += len(raw)
+        parse_before += _parse_time(raw, args.repeat)
+        if args.verify:
+            continue
+
+        new_raw = encode(data, target)
+        if decode(new_raw) != data:
+            failures.append(f"{path}: {target.name} round-trip changed the data")
+            continue
+        size_after += len(new_raw)
+        parse_after += _parse_time(new_raw, args.repeat)
+
+        if args.dry_run or (source is target and path.endswith(target.extension)):
+            continue
+        storage.save_user(user_id, data)
+        if storage.load_user(user_id) != data:
+            failures.append(f"{path}: re-read after conversion differs")
+            continue
+        converted += 1
+
+    total = sum(formats.values())
+    print(f"Directory: {os.path.abspath(args.dir)}")
+    print(f"Files: {total} ({', '.join(f'{name}: {n}' for name, n in formats.items()) or 'none'})")
+    print(f"Size:  {_fmt_size(size_before)}", end="")
+    if not args.verify:
+        print(f" -> {_fmt_size(size_after)} as {target.name} ({_ratio(size_after, size_before)})", end="")
+    print()
+    print(f"Parse: {parse_before * 1000:.2f} ms", end="")
+    if not args.verify:
+        print(f" -> {parse_after * 1000:.2f} ms ({_ratio(parse_after, parse_before)})", end="")
+    print()
+    if not args.verify:
+        print("Dry run, nothing written" if args.dry_run else f"Converted: {converted}")
+    for failure in failures:
+        print(f"FAILED {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
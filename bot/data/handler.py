@@ -1,15 +1,35 @@
 import os
-import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from bot.data.storage import Storage, JsonStorage, SqliteStorage, CachedStorage, ItemKey
+from bot.data.storage import LIBRARY_FILTERS, with_key, display_title
+
+logger = logging.getLogger(__name__)
 
 # = = = = = = = = = = = = = = = = = = FILEPATHS = = = = = = = = = = = = = = = = = =
 
 DATA_PATH = "bot/data/"
 USER_DATA_PATH = DATA_PATH + "users/"
-CURRENT_USER_DATA_FILEPATH_TEMPLATE = USER_DATA_PATH + "{}.json"
 
 if not os.path.exists(USER_DATA_PATH):
     os.mkdir(USER_DATA_PATH)
 
+# "sqlite" (default) or "json" — the legacy one-file-per-user layout
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+LIBRARY_DB_PATH = os.getenv("LIBRARY_DB_PATH", DATA_PATH + "library.sqlite3")
+# File format of the json backend: "compact" (default), "msgpack" or "json" (legacy, pretty-printed)
+LIBRARY_FORMAT = os.getenv("LIBRARY_FORMAT", "compact").lower()
+# "always": fsync every library write; "never": leave flushing to the OS
+STORAGE_FSYNC = os.getenv("STORAGE_FSYNC", "always").lower() != "never"
+# In-memory write-back cache of parsed libraries
+LIBRARY_CACHE_ENABLED = os.getenv("LIBRARY_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+LIBRARY_CACHE_USERS = int(os.getenv("LIBRARY_CACHE_USERS", "500"))
+LIBRARY_FLUSH_DELAY = float(os.getenv("LIBRARY_FLUSH_DELAY", "2.0"))
+
 # = = = = = = = = = = = = = = = = BOT_TOKEN GETTER = = = = = = = = = = = = = = = = =
 
 
@@ -36,36 +56,259 @@ def get_passphrase() -> str:
     raise RuntimeError("BOT_PASSPHRASE not set. Add it to .env or bot/data/passphrase.txt")
 
 
-# = = = = = = = = = = = = = = = USER_DATA MANAGE = = = = = = = = = = = = = = = =
+# = = = = = = = = = = = = = = = = STORAGE BACKEND = = = = = = = = = = = = = = = =
 
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
 
-def _get_user_file_path(conversation_id: int) -> str:
-    return CURRENT_USER_DATA_FILEPATH_TEMPLATE.format(conversation_id)
 
+def _create_backend() -> Storage:
+    if STORAGE_BACKEND == "json":
+        return JsonStorage(USER_DATA_PATH, fsync=STORAGE_FSYNC, codec=LIBRARY_FORMAT)
+    if STORAGE_BACKEND != "sqlite":
+        raise RuntimeError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND!r}")
 
-def _get_user_data(conversation_id: int) -> dict[str:list]:
-    file_path = _get_user_file_path(conversation_id)
+    storage = SqliteStorage(LIBRARY_DB_PATH, fsync=STORAGE_FSYNC)
+    # One-shot import of the legacy per-user JSON files
+    if storage.get_meta("json_migrated") is None:
+        users = storage.import_from(JsonStorage(USER_DATA_PATH))
+        storage.set_meta("json_migrated", "1")
+        if users:
+            logger.info("Migrated %d user libraries from JSON to SQLite", users)
+    return storage
 
-    if not os.path.exists(file_path):
-        with open(file_path, "w", encoding="utf-8") as file:
-            json.dump({}, file, ensure_ascii=False, indent=4)
-        return {}
 
-    with open(file_path, "r", encoding="utf-8") as file:
-        try:
-            return json.load(file)
+def _slim_libraries(storage: Storage) -> int:
+    """
+    One-shot move of full payloads from library entries to the shared catalog.
+    Returns the number of users whose libraries were rewritten.
+    """
+    slim_keys = set(LIBRARY_ENTRY_FIELDS) | {"typename", "id"}
+    users = 0
+    for user_id in storage.user_ids():
+        upserts = {}
+        for ctype, content in storage.load_user(user_id).items():
+            for cid, item in content.items():
+                if set(item) <= slim_keys:
+                    continue
+                # fetched_at=0: the copy may be months old; search and the library
+                # view (bot.helpers.content.refresh_in_background) refetch it
+                _store_in_catalog(ctype, cid, item, replace=False, fetched_at=0)
+                upserts[(ctype, cid)] = library_entry(item)
+        if upserts:
+            storage.apply_changes(user_id, upserts)
+            users += 1
+    return users
+
+
+def _create_storage() -> Storage:
+    backend = _create_backend()
+    if backend.get_meta("catalog_split") is None:
+        users = _slim_libraries(backend)
+        backend.set_meta("catalog_split", "1")
+        if users:
+            logger.info("Moved library payloads of %d users to the content catalog", users)
+    if not LIBRARY_CACHE_ENABLED:
+        return backend
+    return CachedStorage(backend, max_users=LIBRARY_CACHE_USERS, flush_delay=LIBRARY_FLUSH_DELAY)
+
+
+def get_storage() -> Storage:
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = _create_storage()
+    return _storage
+
+
+def set_storage(storage: Optional[Storage]) -> None:
+    """Swaps the active backend (benchmarks, maintenance scripts)."""
+    global _storage
+    _storage = storage
+
+
+def close_storage() -> None:
+    """Flushes pending library changes and closes the backend."""
+    global _storage
+    if _storage is not None:
+        _storage.close()
+        _storage = None
+
+
+# = = = = = = = = = = = = = = = = LIBRARY ENTRIES = = = = = = = = = = = = = = = =
+
+# A library entry only keeps per-user state; everything else about the title
+# lives once in the shared content catalog and is joined in for rendering.
+# "title" stays in the entry so ordering and filter indexes need no catalog lookup.
+LIBRARY_ENTRY_FIELDS = ("title", "viewed", "recommend", "user_review", "added_at")
+# Per-user state never copied into the shared catalog
+_USER_FIELDS = ("viewed", "recommend", "user_review", "added_at")
+
+
+def _catalog():
+    # bot.data.catalog imports DATA_PATH from this module
+    from bot.data.catalog import content_catalog
+
+    return content_catalog
+
+
+def library_entry(content_data: dict) -> dict:
+    """Slim library entry for a title (per-user fields of content_data are kept)."""
+    entry = {
+        "title": content_data.get("title_russian")
+        or content_data.get("title_original")
+        or content_data.get("title")
+        or "",
+        "viewed": bool(content_data.get("viewed", False)),
+        "recommend": content_data.get("recommend"),
+        "added_at": content_data.get("added_at", time.time()),
+    }
+    if content_data.get("user_review"):
+        entry["user_review"] = content_data["user_review"]
+    return entry
+
+
+def _store_in_catalog(
+    content_type: str,
+    content_id: str,
+    content_data: dict,
+    replace: bool,
+    fetched_at: Optional[float] = None,
+) -> None:
+    payload = {k: v for k, v in content_data.items() if k not in _USER_FIELDS}
+    payload.update(typename=content_type, id=content_data.get("id", content_id))
+    if not display_title(payload):
+        # A bare {id, typename} stub (Hubble answered nothing): never replace real
+        # data with it, and keep it stale so the next view fetches the title
+        if replace:
+            return
+        fetched_at = 0
+    if replace:
+        _catalog().put(content_type, content_id, payload, fetched_at)
+    else:
+        _catalog().put_if_absent(content_type, content_id, payload, fetched_at)
+
+
+def join_catalog(items: list[dict]) -> list[dict]:
+    """
+    Library entries (with "typename"/"id") merged over their catalog payloads,
+    ready for card rendering. A title missing from the catalog renders from
+    the entry alone.
+    """
+    if not items:
+        return []
+    entries = _catalog().get_many((item["typename"], item["id"]) for item in items)
+    joined = []
+    for item in items:
+        entry = entries.get((item["typename"], str(item["id"])))
+        if entry is not None:
+            joined.append({**entry.payload, **item})
+        else:
+            joined.append({"title_russian": item.get("title"), **item})
+    return joined
 
-        except json.JSONDecodeError:
-            with open(file_path, "w", encoding="utf-8") as file:
-                json.dump({}, file, ensure_ascii=False, indent=4)
-            return {}
 
+# = = = = = = = = = = = = = = = = TRANSACTIONS = = = = = = = = = = = = = = = =
 
-def _save_user_file(conversation_id: int, data: dict):
-    file_path = _get_user_file_path(conversation_id)
 
-    with open(file_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, ensure_ascii=False, indent=4)
+class UserLibrary:
+    """
+    One user's library inside a transaction.
+    Reads see the changes staged so far; commit() writes all of them to the
+    storage in a single batch. Use it through user_library().
+    """
+
+    def __init__(self, storage: Storage, conversation_id: int):
+        self.storage = storage
+        self.conversation_id = conversation_id
+        self._items: dict[ItemKey, Optional[dict]] = {}  # staged + already read; None = absent
+        self._upserts: set[ItemKey] = set()
+        self._deletes: set[ItemKey] = set()
+        self._loaded: Optional[dict] = None
+
+    def get(self, content_type: str, content_id) -> Optional[dict]:
+        """Returns the item (mutable, call put() to keep changes) or None."""
+        key = (content_type, str(content_id))
+        if key not in self._items:
+            if self._loaded is not None:
+                self._items[key] = self._loaded.get(content_type, {}).get(key[1])
+            else:
+                self._items[key] = self.storage.get_item(self.conversation_id, *key)
+        return self._items[key]
+
+    def contains(self, content_type: str, content_id) -> bool:
+        return bool(self.get(content_type, content_id))
+
+    def put(self, content_type: str, content_id, item: dict) -> None:
+        key = (content_type, str(content_id))
+        self._items[key] = item
+        self._upserts.add(key)
+        self._deletes.discard(key)
+
+    def update(self, content_type: str, content_id, **fields) -> bool:
+        """Sets fields on an existing item. Returns False if it is not in the library."""
+        item = self.get(content_type, content_id)
+        if not item:
+            return False
+        item.update(fields)
+        self.put(content_type, content_id, item)
+        return True
+
+    def delete(self, content_type: str, content_id) -> bool:
+        key = (content_type, str(content_id))
+        if not self.get(*key):
+            return False
+        self._items[key] = None
+        self._upserts.discard(key)
+        self._deletes.add(key)
+        return True
+
+    def items(self, content_type: Optional[str] = None) -> Iterator[tuple[str, str, dict]]:
+        """Iterates (content_type, content_id, item) over the whole library (loads it once)."""
+        self.load()
+        keys = {
+            (ctype, cid) for ctype, content in self._loaded.items() for cid in content
+        } | set(self._items)
+        for ctype, cid in keys:
+            if content_type and ctype != content_type:
+                continue
+            item = self.get(ctype, cid)
+            if item:
+                yield ctype, cid, item
+
+    def load(self) -> "UserLibrary":
+        """Reads the whole library once; later get() / items() don't touch the storage."""
+        if self._loaded is None:
+            self._loaded = self.storage.load_user(self.conversation_id)
+        return self
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self._upserts or self._deletes)
+
+    def commit(self) -> None:
+        if not self.has_changes:
+            return
+        upserts = {key: self._items[key] for key in self._upserts}
+        self.storage.apply_changes(self.conversation_id, upserts, self._deletes)
+        self._upserts = set()
+        self._deletes = set()
+
+
+def open_user_library(conversation_id: int) -> UserLibrary:
+    return UserLibrary(get_storage(), conversation_id)
+
+
+@contextmanager
+def user_library(conversation_id: int) -> Iterator[UserLibrary]:
+    """
+    with user_library(chat_id) as lib: ... — any number of reads and
+    mutations, committed once on exit (discarded if the block raises).
+    """
+    lib = open_user_library(conversation_id)
+    yield lib
+    lib.commit()
 
 
 # = = = = = = = = = = = = = = = = = USERLIB MANAGE = = = = = = = = = = = = = = = = = = = = = =
@@ -74,10 +317,7 @@ def _save_user_file(conversation_id: int, data: dict):
 def is_content_in_user_lib(
     conversation_id: int, content_type: str, content_id: int
 ) -> bool:
-    content_id = str(content_id)
-    data = _get_user_data(conversation_id)
-    content_data: dict = data.get(content_type, {})
-    content_data: dict = content_data.get(content_id, {})
+    content_data = get_storage().get_item(conversation_id, content_type, str(content_id))
 
     if content_data:
         return True
@@ -85,69 +325,61 @@ def is_content_in_user_lib(
 
 
 def get_user_lib(conversation_id: int, content_type: str = None) -> dict:
-    user_data = _get_user_data(conversation_id)
+    """Library as {content_type: {content_id: item}}, items joined with the catalog."""
+    user_data = get_storage().load_user(conversation_id)
+    items = join_catalog([
+        with_key(item, ctype, cid)
+        for ctype, content in user_data.items()
+        if not content_type or ctype == content_type
+        for cid, item in content.items()
+    ])
+    joined: dict[str, dict] = {}
+    for item in items:
+        joined.setdefault(item["typename"], {})[item["id"]] = item
 
     if content_type:
-        current_content_type_user_data = user_data.get(content_type, {})
-        return current_content_type_user_data
+        return joined.get(content_type, {})
+    return joined
+
 
-    return user_data
+def get_lib_item(conversation_id: int, content_type: str, content_id: int) -> Optional[dict]:
+    """
+    Returns the slim library entry (viewed, recommend, ...), or None if it is
+    not in the library. Use join_catalog() for the full card data.
+    """
+    return get_storage().get_item(conversation_id, content_type, str(content_id)) or None
 
 
 def save_content_to_user_lib(conversation_id: int, content_data: dict) -> bool:
     content_id = str(content_data.get("id"))
     content_type = content_data.get("typename")
 
-    if is_content_in_user_lib(conversation_id, content_type, content_id):
-        return False
-
-    user_data = _get_user_data(conversation_id)
-    current_content_type_user_data = user_data.get(content_type, {})
-
-    if content_id not in current_content_type_user_data:
-        current_content_type_user_data[content_id] = content_data
-        user_data[content_type] = current_content_type_user_data
-        _save_user_file(conversation_id, user_data)
-        return True
-
-    return False
+    with user_library(conversation_id) as lib:
+        if lib.contains(content_type, content_id):
+            return False
+        _store_in_catalog(content_type, content_id, content_data, replace=False)
+        lib.put(content_type, content_id, library_entry(content_data))
+    return True
 
 
 def update_content_in_user_lib(conversation_id: int, content_data: dict) -> bool:
+    """Refreshes the catalog copy of a title that is in the library."""
     content_id = str(content_data.get("id"))
     content_type = content_data.get("typename")
 
-    if not is_content_in_user_lib(conversation_id, content_type, content_id):
-        return
-
-    user_data = _get_user_data(conversation_id)
-    current_content_type_user_data = user_data.get(content_type, {})
-
-    current_content_type_user_data[content_id] = content_data
-    user_data[content_type] = current_content_type_user_data
-
-    _save_user_file(conversation_id, user_data)
-
+    with user_library(conversation_id) as lib:
+        if not lib.contains(content_type, content_id):
+            return
+        _store_in_catalog(content_type, content_id, content_data, replace=True)
+        lib.update(content_type, content_id, title=library_entry(content_data)["title"])
     return True
 
 
 def delete_content_from_user_lib(
     conversation_id: int, content_type: str, content_id: int
 ) -> bool:
-    content_id = str(content_id)
-    if not is_content_in_user_lib(conversation_id, content_type, content_id):
-        return False
-
-    user_data = _get_user_data(conversation_id)
-    current_content_type_user_data = user_data.get(content_type, {})
-
-    if content_id in current_content_type_user_data:
-        del current_content_type_user_data[content_id]
-        user_data[content_type] = current_content_type_user_data
-        _save_user_file(conversation_id, user_data)
-        return True
-
-    return False
+    with user_library(conversation_id) as lib:
+        return lib.delete(content_type, content_id)
 
 
 # = = = = = = = = = = = = = = = = VIEWED = = = = = = = = = = = = = = =
@@ -156,43 +388,20 @@ def delete_content_from_user_lib(
 def mark_as_viewed(
     conversation_id: int, content_type: str, content_id: int, recommend: bool = False
 ) -> bool:
-    content_id = str(content_id)
-    if not is_content_in_user_lib(conversation_id, content_type, content_id):
-        return False
-
-    user_data = _get_user_data(conversation_id)
-    current_content_type_user_data = user_data.get(content_type, {})
-
-    current_content_type_user_data[content_id]["viewed"] = True
-    if recommend:
-        current_content_type_user_data[content_id]["recommend"] = True
-    elif not recommend:
-        current_content_type_user_data[content_id]["recommend"] = False
-
-    for content_data in current_content_type_user_data.values():
-        if not update_content_in_user_lib(conversation_id, content_data):
-            return False
-    return True
+    with user_library(conversation_id) as lib:
+        return lib.update(content_type, content_id, viewed=True, recommend=bool(recommend))
 
 
 # = = = = = = = = = = = = = = = = RECOMMENDS = = = = = = = = = = = = = = =
 
 
 def get_users_recommends(conversation_id: int) -> dict[str:list]:
-    user_data = _get_user_data(conversation_id)
     recommends = {"film": [], "tvseries": []}
 
-    # get all subdicts where is key 'recommend' == True:
-    user_films: dict = user_data.get("film", {})
-    user_tvseries: dict = user_data.get("tvseries", {})
-
-    for film in user_films.values():
-        if film.get("recommend"):
-            recommends["film"].append(film)
-
-    for tvseries in user_tvseries.values():
-        if tvseries.get("recommend"):
-            recommends["tvseries"].append(tvseries)
+    # all items where 'recommend' == True — the "rec" filter, index-backed when cached:
+    for item in get_filtered_lib(conversation_id, "rec"):
+        if item["typename"] in recommends:
+            recommends[item["typename"]].append(item)
 
     if not recommends["film"] and not recommends["tvseries"]:
         return None
@@ -202,13 +411,25 @@ def get_users_recommends(conversation_id: int) -> dict[str:list]:
 def is_this_content_already_recommend(
     conversation_id: int, content_type: str, content_id: int
 ) -> bool:
-    user_recommends = get_users_recommends(conversation_id)
-    if not user_recommends:
-        return False
-    user_current_content_type_recommends = user_recommends.get(content_type, [])
-    if user_current_content_type_recommends:
-        return content_id in user_recommends.get(content_type)
-    return False
+    return get_storage().recommend_status(conversation_id, content_type, str(content_id)) is True
+
+
+def get_library_titles(content_type: str) -> dict[str, str]:
+    """{content_id: title} of every title of this type saved by any user."""
+    return get_storage().content_titles(content_type)
+
+
+def get_content_holders(content_type: str, content_ids) -> dict[int, set[str]]:
+    """{user_id: ids} of the users who saved any of the given titles."""
+    return get_storage().holders(content_type, [str(cid) for cid in content_ids])
+
+
+def get_recommend_ids(conversation_id: int, recommend: bool = True) -> dict[str, set[str]]:
+    """
+    {content_type: ids} of titles the user recommends (recommend=True)
+    or advises against (recommend=False). No catalog lookups.
+    """
+    return get_storage().recommend_ids(conversation_id, bool(recommend))
 
 
 def mark_as_recommend(
@@ -223,87 +444,67 @@ def mark_as_recommend(
     Перед вызовом проверить не отмечен ли контент как рекомендованный
     Если контент уже рекомендован - возвращает False.
     """
-    content_id = str(content_id)
-
-    if not is_content_in_user_lib(conversation_id, content_type, content_id):
-        return False
-
     if is_this_content_already_recommend(conversation_id, content_type, content_id):
         return False
 
-    user_data = _get_user_data(conversation_id)
-    current_content_type_user_data = user_data.get(content_type, {})
-    current_content_type_user_data[content_id]["viewed"] = True
-
-    if recommend:
-        current_content_type_user_data[content_id]["recommend"] = True
-    else:
-        current_content_type_user_data[content_id]["recommend"] = False
-
+    fields = {"viewed": True, "recommend": bool(recommend)}
     if user_review:
-        current_content_type_user_data[content_id]["user_review"] = user_review
+        fields["user_review"] = user_review
 
-    _save_user_file(conversation_id, user_data)
-    return True
+    with user_library(conversation_id) as lib:
+        return lib.update(content_type, content_id, **fields)
 
 
 # = = = = = = = = = = = = = = = = LIBRARY FILTERING = = = = = = = = = = = = = = = =
 
-
 def get_filtered_lib(conversation_id: int, filter_key: str = "all") -> list:
     """
     Returns a flat sorted list of library items matching the given filter.
     filter_key: "all" | "film" | "tv" | "seen" | "unseen" | "rec"
-    Each item dict has "typename" and "id" ensured from the JSON structure.
+    Each item dict has "typename" and "id" ensured from the library key.
+    """
+    criteria = LIBRARY_FILTERS.get(filter_key, {})
+    return join_catalog(get_storage().query_items(conversation_id, **criteria))
+
+
+def get_lib_page(
+    conversation_id: int, filter_key: str = "all", idx: int = 0
+) -> tuple[Optional[dict], int, int]:
+    """
+    Returns (item, idx, total) for one position of the filtered library
+    without building the whole list; idx is clamped into range.
     """
-    user_data = _get_user_data(conversation_id)
-    items = []
-
-    for ctype in ("film", "tvseries"):
-        for cid, item in user_data.get(ctype, {}).items():
-            item = dict(item)
-            item["typename"] = ctype
-            item["id"] = cid
-            items.append(item)
-
-    if filter_key == "film":
-        items = [i for i in items if i["typename"] == "film"]
-    elif filter_key == "tv":
-        items = [i for i in items if i["typename"] == "tvseries"]
-    elif filter_key == "seen":
-        items = [i for i in items if i.get("viewed", False)]
-    elif filter_key == "unseen":
-        items = [i for i in items if not i.get("viewed", False)]
-    elif filter_key == "rec":
-        items = [i for i in items if i.get("recommend") is True]
-
-    items.sort(
-        key=lambda x: (x.get("title_russian") or x.get("title_original", "")).lower()
-    )
-    return items
+    storage = get_storage()
+    item, total = storage.filtered_page(conversation_id, filter_key, idx)
+    if item is None and total:
+        idx = max(0, min(idx, total - 1))
+        item, total = storage.filtered_page(conversation_id, filter_key, idx)
+    if item is not None:
+        item = join_catalog([item])[0]
+    return item, idx, total
+
+
+def get_lib_total(conversation_id: int, filter_key: str = "all") -> int:
+    """Number of items in the filtered library (no catalog join)."""
+    return get_storage().filtered_total(conversation_id, filter_key)
+
+
+def get_lib_position(
+    conversation_id: int, filter_key: str, content_type: str, content_id: int
+) -> Optional[int]:
+    """Position of an item within the filtered library, or None."""
+    return get_storage().filtered_position(conversation_id, filter_key, content_type, str(content_id))
 
 
 def mark_viewed_only(conversation_id: int, content_type: str, content_id: int) -> bool:
     """Marks content as viewed without touching the recommend flag."""
-    content_id = str(content_id)
-    if not is_content_in_user_lib(conversation_id, content_type, content_id):
-        return False
-
-    user_data = _get_user_data(conversation_id)
-    user_data.setdefault(content_type, {})[content_id]["viewed"] = True
-    _save_user_file(conversation_id, user_data)
-    return True
+    with user_library(conversation_id) as lib:
+        return lib.update(content_type, content_id, viewed=True)
 
 
 def set_recommend_status(
     conversation_id: int, content_type: str, content_id: int, recommend: bool
 ) -> bool:
     """Sets the recommend flag (True / False) on an existing library item."""
-    content_id = str(content_id)
-    if not is_content_in_user_lib(conversation_id, content_type, content_id):
-        return False
-
-    user_data = _get_user_data(conversation_id)
-    user_data.setdefault(content_type, {})[content_id]["recommend"] = recommend
-    _save_user_file(conversation_id, user_data)
-    return True
+    with user_library(conversation_id) as lib:
+        return lib.update(content_type, content_id, recommend=bool(recommend))
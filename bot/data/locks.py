@@ -0,0 +1,63 @@
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+# Waits longer than this are logged: a user's mutations are piling up
+LIBRARY_LOCK_WARN = float(os.getenv("LIBRARY_LOCK_WARN", "1.0"))
+
+
+class UserLocks:
+    """
+    One asyncio.Lock per user, so library read-modify-write cycles of a user
+    run one at a time while other users proceed in parallel.
+    Locks exist only while someone holds or waits for them.
+    """
+
+    def __init__(self, warn_after: float = LIBRARY_LOCK_WARN):
+        self.warn_after = warn_after
+        self._locks: dict[int, tuple[asyncio.Lock, list[int]]] = {}  # user_id -> (lock, [users])
+        self.acquired = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @asynccontextmanager
+    async def hold(self, user_id: int) -> AsyncIterator[None]:
+        """Not reentrant: don't take a user's lock again inside the block."""
+        lock, users = self._locks.setdefault(user_id, (asyncio.Lock(), [0]))
+        users[0] += 1
+        try:
+            if lock.locked():
+                self.contended += 1
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            async with lock:
+                self._record_wait(user_id, loop.time() - started)
+                yield
+        finally:
+            users[0] -= 1
+            if not users[0]:
+                del self._locks[user_id]
+
+    def _record_wait(self, user_id: int, waited: float) -> None:
+        self.acquired += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        if waited >= self.warn_after:
+            logger.warning("Library lock of user %s waited %.2fs", user_id, waited)
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._locks),
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "wait_avg": round(self.wait_total / self.acquired, 4) if self.acquired else 0.0,
+            "wait_max": round(self.wait_max, 4),
+        }
+
+
+user_locks = UserLocks()
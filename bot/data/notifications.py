@@ -0,0 +1,131 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from typing import Iterable, Optional
+
+from bot.data.handler import DATA_PATH
+
+NOTIFY_PATH = os.getenv("NOTIFY_PATH", DATA_PATH + "notifications.sqlite3")
+
+
+class NotificationStore:
+    """
+    Who opted in to new-episode notifications, and which (user, series,
+    release date) notifications went out already, so a pass can be re-run
+    (restart, catch-up) without sending anything twice.
+    """
+
+    def __init__(self, path: str = NOTIFY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS subscribers (
+                    user_id INTEGER PRIMARY KEY,
+                    since   REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS sent (
+                    user_id      INTEGER NOT NULL,
+                    series_id    TEXT NOT NULL,
+                    release_date TEXT NOT NULL,
+                    PRIMARY KEY (user_id, series_id, release_date)
+                );
+                """
+            )
+            self._conn = conn
+        return self._conn
+
+    def subscribe(self, user_id: int) -> bool:
+        """Returns False if the user was subscribed already."""
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO subscribers (user_id, since) VALUES (?, ?)", (user_id, time.time())
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def unsubscribe(self, user_id: int) -> bool:
+        """Returns False if the user wasn't subscribed."""
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute("DELETE FROM subscribers WHERE user_id = ?", (user_id,))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def is_subscribed(self, user_id: int) -> bool:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT 1 FROM subscribers WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return row is not None
+
+    def subscribers(self) -> set[int]:
+        with self._lock:
+            rows = self._connect().execute("SELECT user_id FROM subscribers").fetchall()
+        return {row[0] for row in rows}
+
+    def sent_on(self, release_date: str) -> set[tuple[int, str]]:
+        """(user_id, series_id) pairs already notified about release_date."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT user_id, series_id FROM sent WHERE release_date = ?", (release_date,)
+            ).fetchall()
+        return {(user_id, series_id) for user_id, series_id in rows}
+
+    def mark_sent(self, pairs: Iterable[tuple[int, str]], release_date: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR IGNORE INTO sent (user_id, series_id, release_date) VALUES (?, ?, ?)",
+                [(user_id, series_id, release_date) for user_id, series_id in pairs],
+            )
+            conn.commit()
+
+    def prune_sent(self, before: str) -> None:
+        """Forgets notifications about release dates older than before ("YYYY-MM-DD")."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM sent WHERE release_date < ?", (before,))
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # Async wrappers: keep sqlite I/O off the event loop
+
+    async def asubscribe(self, user_id: int) -> bool:
+        return await asyncio.to_thread(self.subscribe, user_id)
+
+    async def aunsubscribe(self, user_id: int) -> bool:
+        return await asyncio.to_thread(self.unsubscribe, user_id)
+
+    async def ais_subscribed(self, user_id: int) -> bool:
+        return await asyncio.to_thread(self.is_subscribed, user_id)
+
+    async def asubscribers(self) -> set[int]:
+        return await asyncio.to_thread(self.subscribers)
+
+    async def asent_on(self, release_date: str) -> set[tuple[int, str]]:
+        return await asyncio.to_thread(self.sent_on, release_date)
+
+    async def amark_sent(self, pairs: Iterable[tuple[int, str]], release_date: str) -> None:
+        await asyncio.to_thread(self.mark_sent, list(pairs), release_date)
+
+    async def aprune_sent(self, before: str) -> None:
+        await asyncio.to_thread(self.prune_sent, before)
+
+
+notification_store = NotificationStore()
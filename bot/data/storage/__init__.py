@@ -0,0 +1,7 @@
+from bot.data.storage.base import Storage, ItemKey, CONTENT_TYPES, LIBRARY_FILTERS, FILTER_KEYS
+from bot.data.storage.base import title_sort_key, with_key, matches_filter, display_title
+from bot.data.storage.index import LibraryIndex
+from bot.data.storage.serialization import Codec, CODECS, SerializationError, UnsupportedFormatError, get_codec, encode, decode
+from bot.data.storage.json_storage import JsonStorage
+from bot.data.storage.sqlite_storage import SqliteStorage
+from bot.data.storage.cached_storage import CachedStorage
@@ -0,0 +1,191 @@
+from abc import ABC, abstractmethod
+from typing import Iterable, Optional
+
+# (content_type, content_id) — content_id is always the string key used in the library
+ItemKey = tuple[str, str]
+
+CONTENT_TYPES = ("film", "tvseries")
+
+# Library carousel filters -> query_items criteria
+LIBRARY_FILTERS = {
+    "all": {},
+    "film": {"content_type": "film"},
+    "tv": {"content_type": "tvseries"},
+    "seen": {"viewed": True},
+    "unseen": {"viewed": False},
+    "rec": {"recommend": True},
+}
+FILTER_KEYS = tuple(LIBRARY_FILTERS)
+
+
+def title_sort_key(item: dict) -> str:
+    """
+    Library sort order: case-insensitive russian title, original title as fallback.
+    Slim library entries only carry "title" (see bot.data.handler.library_entry).
+    """
+    return (item.get("title_russian") or item.get("title_original") or item.get("title") or "").lower()
+
+
+def display_title(item: dict) -> str:
+    """Title to show / look a title up by, for full payloads and slim entries alike."""
+    return item.get("title_russian") or item.get("title") or item.get("title_original") or ""
+
+
+def matches_filter(filter_key: str, content_type: str, item: dict) -> bool:
+    criteria = LIBRARY_FILTERS.get(filter_key, {})
+    if "content_type" in criteria and content_type != criteria["content_type"]:
+        return False
+    if "viewed" in criteria and bool(item.get("viewed", False)) != criteria["viewed"]:
+        return False
+    if "recommend" in criteria and (item.get("recommend") is True) != criteria["recommend"]:
+        return False
+    return True
+
+
+def with_key(item: dict, content_type: str, content_id: str) -> dict:
+    """Copy of a stored item with "typename" and "id" ensured from its library key."""
+    item = dict(item)
+    item["typename"] = content_type
+    item["id"] = content_id
+    return item
+
+
+class Storage(ABC):
+    """
+    Backend for user libraries.
+    A library is {content_type: {content_id: item}}, exactly what the old
+    per-user JSON files held; backends only differ in how it hits the disk.
+    """
+
+    @abstractmethod
+    def load_user(self, user_id: int) -> dict[str, dict[str, dict]]:
+        """Returns the whole library of a user ({} if the user is unknown)."""
+
+    @abstractmethod
+    def get_item(self, user_id: int, content_type: str, content_id: str) -> Optional[dict]:
+        """Returns a single library item or None."""
+
+    @abstractmethod
+    def apply_changes(
+        self,
+        user_id: int,
+        upserts: dict[ItemKey, dict],
+        deletes: Iterable[ItemKey] = (),
+    ) -> None:
+        """Writes a batch of item upserts and deletes for one user in one go."""
+
+    @abstractmethod
+    def user_ids(self) -> list[int]:
+        """Returns ids of every user that has stored data."""
+
+    @abstractmethod
+    def get_meta(self, key: str) -> Optional[str]:
+        """Backend-level bookkeeping (migration flags and such): value or None."""
+
+    @abstractmethod
+    def set_meta(self, key: str, value: str) -> None:
+        """Stores a bookkeeping value."""
+
+    def query_items(
+        self,
+        user_id: int,
+        content_type: Optional[str] = None,
+        viewed: Optional[bool] = None,
+        recommend: Optional[bool] = None,
+    ) -> list[dict]:
+        """
+        Returns library items matching every given criterion, sorted by title.
+        Each item has "typename" and "id" ensured. recommend=True matches only
+        items explicitly recommended.
+        """
+        items = []
+        for ctype, content in self.load_user(user_id).items():
+            if content_type and ctype != content_type:
+                continue
+            for cid, item in content.items():
+                if viewed is not None and bool(item.get("viewed", False)) != viewed:
+                    continue
+                if recommend is not None and (item.get("recommend") is True) != recommend:
+                    continue
+                items.append(with_key(item, ctype, cid))
+        items.sort(key=lambda item: (title_sort_key(item), item["typename"], item["id"]))
+        return items
+
+    def filtered_page(self, user_id: int, filter_key: str, idx: int) -> tuple[Optional[dict], int]:
+        """Returns (item at position idx of the filtered library or None, filter total)."""
+        items = self.query_items(user_id, **LIBRARY_FILTERS.get(filter_key, {}))
+        if 0 <= idx < len(items):
+            return items[idx], len(items)
+        return None, len(items)
+
+    def filtered_total(self, user_id: int, filter_key: str) -> int:
+        """Number of items in a filtered library."""
+        return len(self.query_items(user_id, **LIBRARY_FILTERS.get(filter_key, {})))
+
+    def filtered_position(self, user_id: int, filter_key: str, content_type: str, content_id: str) -> Optional[int]:
+        """Position of an item within a filtered library, or None if it isn't there."""
+        items = self.query_items(user_id, **LIBRARY_FILTERS.get(filter_key, {}))
+        return next(
+            (i for i, item in enumerate(items)
+             if item["typename"] == content_type and item["id"] == str(content_id)),
+            None,
+        )
+
+    def recommend_status(self, user_id: int, content_type: str, content_id: str) -> Optional[bool]:
+        """True / False if the user does / doesn't recommend the title; None if undecided or absent."""
+        item = self.get_item(user_id, content_type, str(content_id))
+        flag = item.get("recommend") if item else None
+        return flag if flag is True or flag is False else None
+
+    def recommend_ids(self, user_id: int, recommend: bool = True) -> dict[str, set[str]]:
+        """{content_type: ids} of the titles whose recommend flag is exactly `recommend`."""
+        ids: dict[str, set[str]] = {}
+        for ctype, content in self.load_user(user_id).items():
+            for cid, item in content.items():
+                if item.get("recommend") is recommend:
+                    ids.setdefault(ctype, set()).add(str(cid))
+        return ids
+
+    def content_titles(self, content_type: str) -> dict[str, str]:
+        """{content_id: title} of every title of this type in any library, deduplicated."""
+        titles: dict[str, str] = {}
+        for user_id in self.user_ids():
+            for cid, item in self.load_user(user_id).get(content_type, {}).items():
+                titles.setdefault(str(cid), display_title(item))
+        return titles
+
+    def holders(self, content_type: str, content_ids: Iterable[str]) -> dict[int, set[str]]:
+        """{user_id: ids} of the users whose library holds any of the given titles."""
+        wanted = {str(cid) for cid in content_ids}
+        result: dict[int, set[str]] = {}
+        for user_id in self.user_ids():
+            ids = wanted.intersection(self.load_user(user_id).get(content_type, {}))
+            if ids:
+                result[user_id] = ids
+        return result
+
+    def write_back(
+        self,
+        user_id: int,
+        data: dict[str, dict[str, dict]],
+        upserts: dict[ItemKey, dict],
+        deletes: Iterable[ItemKey] = (),
+    ) -> None:
+        """
+        Persists changes flushed from a cache. data is the full library after
+        the changes, for backends that rewrite everything anyway.
+        """
+        self.apply_changes(user_id, upserts, deletes)
+
+    def put_item(self, user_id: int, content_type: str, content_id: str, item: dict) -> None:
+        self.apply_changes(user_id, {(content_type, str(content_id)): item})
+
+    def delete_item(self, user_id: int, content_type: str, content_id: str) -> bool:
+        content_id = str(content_id)
+        if self.get_item(user_id, content_type, content_id) is None:
+            return False
+        self.apply_changes(user_id, {}, [(content_type, content_id)])
+        return True
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,280 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from bot.data.storage.base import Storage, ItemKey, LIBRARY_FILTERS, display_title, with_key
+from bot.data.storage.index import LibraryIndex
+
+logger = logging.getLogger(__name__)
+
+
+class _CachedLibrary:
+    __slots__ = ("data", "dirty", "deleted", "timer", "_index")
+
+    def __init__(self, data: dict):
+        self.data: dict[str, dict[str, dict]] = data
+        self.dirty: set[ItemKey] = set()
+        self.deleted: set[ItemKey] = set()
+        self.timer: Optional[threading.Timer] = None
+        self._index: Optional[LibraryIndex] = None
+
+    @property
+    def index(self) -> LibraryIndex:
+        """Filter indexes, built on first use and maintained by set/remove afterwards."""
+        if self._index is None:
+            self._index = LibraryIndex.build(self.data)
+        return self._index
+
+    def set(self, key: ItemKey, item: dict) -> None:
+        content = self.data.setdefault(key[0], {})
+        old = content.get(key[1])
+        content[key[1]] = item
+        if self._index is not None:
+            if old is not None:
+                self._index.remove(key[0], key[1], old)
+            self._index.add(key[0], key[1], item)
+
+    def remove(self, key: ItemKey) -> None:
+        old = self.data.get(key[0], {}).pop(key[1], None)
+        if old is not None and self._index is not None:
+            self._index.remove(key[0], key[1], old)
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self.dirty or self.deleted)
+
+
+class CachedStorage(Storage):
+    """
+    Write-back cache of parsed user libraries in front of another backend.
+    Each library is read from disk once; mutations are applied in memory,
+    marked dirty and flushed at most flush_delay seconds later.
+    Inactive users are evicted LRU-first (after flushing).
+    """
+
+    def __init__(self, backend: Storage, max_users: int = 500, flush_delay: float = 2.0):
+        self.backend = backend
+        self.max_users = max_users
+        self.flush_delay = flush_delay
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._libraries: "OrderedDict[int, _CachedLibrary]" = OrderedDict()
+
+    # = = = = = = = = = = = = = = = = CACHE = = = = = = = = = = = = = = = =
+
+    def _entry(self, user_id: int) -> _CachedLibrary:
+        with self._lock:
+            entry = self._libraries.get(user_id)
+            if entry is not None:
+                self._libraries.move_to_end(user_id)
+                return entry
+
+        data = self.backend.load_user(user_id)
+        with self._lock:
+            # Another thread may have loaded it meanwhile: keep the first copy
+            entry = self._libraries.get(user_id)
+            if entry is None:
+                entry = self._libraries[user_id] = _CachedLibrary(data)
+            self._libraries.move_to_end(user_id)
+        self._evict()
+        return entry
+
+    def _evict(self) -> None:
+        while True:
+            with self._lock:
+                if len(self._libraries) <= self.max_users:
+                    return
+                user_id = next(iter(self._libraries))
+                dirty = self._libraries[user_id].is_dirty
+            if dirty:
+                self.flush_user(user_id)
+            with self._lock:
+                entry = self._libraries.get(user_id)
+                if entry is not None and not entry.is_dirty:
+                    del self._libraries[user_id]
+                elif entry is not None:
+                    # Re-dirtied during the flush: try the next one later
+                    self._libraries.move_to_end(user_id)
+
+    def _schedule_flush(self, user_id: int, entry: _CachedLibrary, delay: float) -> None:
+        """Arms the flush timer unless one is already pending. Call with _lock held."""
+        if entry.timer is not None:
+            return
+        entry.timer = threading.Timer(delay, self.flush_user, args=(user_id,))
+        entry.timer.daemon = True
+        entry.timer.start()
+
+    def flush_user(self, user_id: int) -> None:
+        """Writes a user's pending changes to the backend."""
+        with self._flush_lock:
+            with self._lock:
+                entry = self._libraries.get(user_id)
+                if entry is None:
+                    return
+                if entry.timer is not None:
+                    entry.timer.cancel()
+                    entry.timer = None
+                if not entry.is_dirty:
+                    return
+                upserts = {
+                    key: dict(entry.data[key[0]][key[1]])
+                    for key in entry.dirty
+                    if key[1] in entry.data.get(key[0], {})
+                }
+                deletes = set(entry.deleted)
+                snapshot = {ctype: dict(content) for ctype, content in entry.data.items()}
+                entry.dirty.clear()
+                entry.deleted.clear()
+            try:
+                self.backend.write_back(user_id, snapshot, upserts, deletes)
+            except Exception:
+                logger.exception("Failed to flush library of user %s, will retry", user_id)
+                with self._lock:
+                    entry.dirty |= set(upserts) - entry.deleted
+                    entry.deleted |= deletes - entry.dirty
+                    self._schedule_flush(user_id, entry, max(self.flush_delay, 1.0))
+
+    def flush_all(self) -> None:
+        with self._lock:
+            user_ids = [uid for uid, entry in self._libraries.items() if entry.is_dirty]
+        for user_id in user_ids:
+            self.flush_user(user_id)
+
+    # = = = = = = = = = = = = = = = = STORAGE = = = = = = = = = = = = = = = =
+
+    def load_user(self, user_id: int) -> dict:
+        entry = self._entry(user_id)
+        with self._lock:
+            return {
+                ctype: {cid: dict(item) for cid, item in content.items()}
+                for ctype, content in entry.data.items()
+            }
+
+    def get_item(self, user_id: int, content_type: str, content_id: str) -> Optional[dict]:
+        entry = self._entry(user_id)
+        with self._lock:
+            item = entry.data.get(content_type, {}).get(str(content_id))
+            return dict(item) if item is not None else None
+
+    def apply_changes(
+        self,
+        user_id: int,
+        upserts: dict[ItemKey, dict],
+        deletes: Iterable[ItemKey] = (),
+    ) -> None:
+        entry = self._entry(user_id)
+        with self._lock:
+            for (ctype, cid), item in upserts.items():
+                key = (ctype, str(cid))
+                entry.set(key, dict(item))
+                entry.dirty.add(key)
+                entry.deleted.discard(key)
+            for ctype, cid in deletes:
+                key = (ctype, str(cid))
+                entry.remove(key)
+                entry.dirty.discard(key)
+                entry.deleted.add(key)
+            if entry.is_dirty and self.flush_delay > 0:
+                self._schedule_flush(user_id, entry, self.flush_delay)
+        if self.flush_delay <= 0:
+            self.flush_user(user_id)
+
+    def query_items(
+        self,
+        user_id: int,
+        content_type: Optional[str] = None,
+        viewed: Optional[bool] = None,
+        recommend: Optional[bool] = None,
+    ) -> list[dict]:
+        criteria = {
+            key: value
+            for key, value in (("content_type", content_type), ("viewed", viewed), ("recommend", recommend))
+            if value is not None
+        }
+        filter_key = next((key for key, value in LIBRARY_FILTERS.items() if value == criteria), None)
+        if filter_key is None:
+            return super().query_items(user_id, content_type, viewed, recommend)
+
+        entry = self._entry(user_id)
+        with self._lock:
+            index = entry.index
+            return [
+                with_key(entry.data[ctype][cid], ctype, cid)
+                for ctype, cid in (index.at(filter_key, i) for i in range(index.total(filter_key)))
+            ]
+
+    def filtered_page(self, user_id: int, filter_key: str, idx: int) -> tuple[Optional[dict], int]:
+        entry = self._entry(user_id)
+        with self._lock:
+            index = entry.index
+            key = index.at(filter_key, idx)
+            item = with_key(entry.data[key[0]][key[1]], *key) if key else None
+            return item, index.total(filter_key)
+
+    def filtered_total(self, user_id: int, filter_key: str) -> int:
+        entry = self._entry(user_id)
+        with self._lock:
+            return entry.index.total(filter_key)
+
+    def filtered_position(self, user_id: int, filter_key: str, content_type: str, content_id: str) -> Optional[int]:
+        entry = self._entry(user_id)
+        with self._lock:
+            item = entry.data.get(content_type, {}).get(str(content_id))
+            if item is None:
+                return None
+            return entry.index.position(filter_key, content_type, str(content_id), item)
+
+    def recommend_status(self, user_id: int, content_type: str, content_id: str) -> Optional[bool]:
+        entry = self._entry(user_id)
+        with self._lock:
+            return entry.index.recommend_status(content_type, str(content_id))
+
+    def recommend_ids(self, user_id: int, recommend: bool = True) -> dict[str, set[str]]:
+        entry = self._entry(user_id)
+        with self._lock:
+            return entry.index.recommend_ids(recommend)
+
+    def content_titles(self, content_type: str) -> dict[str, str]:
+        titles = self.backend.content_titles(content_type)
+        # Libraries changed since the last flush may hold titles the backend hasn't seen
+        with self._lock:
+            for entry in self._libraries.values():
+                for cid, item in entry.data.get(content_type, {}).items():
+                    titles.setdefault(cid, display_title(item))
+        return titles
+
+    def holders(self, content_type: str, content_ids: Iterable[str]) -> dict[int, set[str]]:
+        wanted = {str(cid) for cid in content_ids}
+        result = self.backend.holders(content_type, wanted)
+        # Cached libraries are authoritative: they may hold unflushed adds and deletes
+        with self._lock:
+            for user_id, entry in self._libraries.items():
+                ids = wanted.intersection(entry.data.get(content_type, {}))
+                if ids:
+                    result[user_id] = ids
+                else:
+                    result.pop(user_id, None)
+        return result
+
+    def user_ids(self) -> list[int]:
+        with self._lock:
+            cached = {uid for uid, entry in self._libraries.items() if entry.data}
+        return sorted(cached | set(self.backend.user_ids()))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": len(self._libraries),
+                "dirty": sum(entry.is_dirty for entry in self._libraries.values()),
+            }
+
+    def get_meta(self, key: str) -> Optional[str]:
+        return self.backend.get_meta(key)
+
+    def set_meta(self, key: str, value: str) -> None:
+        self.backend.set_meta(key, value)
+
+    def close(self) -> None:
+        self.flush_all()
+        self.backend.close()
@@ -0,0 +1,87 @@
+from bisect import bisect_left, insort
+from typing import Optional
+
+from bot.data.storage.base import FILTER_KEYS, matches_filter, title_sort_key
+
+# Index entry: (title sort key, content_type, content_id)
+IndexEntry = tuple[str, str, str]
+
+
+class LibraryIndex:
+    """
+    Sorted (by title) id lists of one user's library, one per library filter,
+    plus the sets of recommended / not recommended ids per content type.
+    Built once from the cached library and updated item by item afterwards,
+    so paging needs a list lookup instead of a filter + sort of every item.
+    """
+
+    def __init__(self):
+        self._lists: dict[str, list[IndexEntry]] = {key: [] for key in FILTER_KEYS}
+        # recommend flag (True / False; undecided titles aren't kept) -> content_type -> ids
+        self._recommend: dict[bool, dict[str, set[str]]] = {True: {}, False: {}}
+
+    @classmethod
+    def build(cls, data: dict[str, dict[str, dict]]) -> "LibraryIndex":
+        index = cls()
+        for key in FILTER_KEYS:
+            index._lists[key] = sorted(
+                (title_sort_key(item), ctype, cid)
+                for ctype, content in data.items()
+                for cid, item in content.items()
+                if matches_filter(key, ctype, item)
+            )
+        for ctype, content in data.items():
+            for cid, item in content.items():
+                index._add_recommend(ctype, cid, item)
+        return index
+
+    def _add_recommend(self, content_type: str, content_id: str, item: dict) -> None:
+        flag = item.get("recommend")
+        if flag is True or flag is False:
+            self._recommend[flag].setdefault(content_type, set()).add(content_id)
+
+    def add(self, content_type: str, content_id: str, item: dict) -> None:
+        entry = (title_sort_key(item), content_type, content_id)
+        for key, entries in self._lists.items():
+            if matches_filter(key, content_type, item):
+                insort(entries, entry)
+        self._add_recommend(content_type, content_id, item)
+
+    def remove(self, content_type: str, content_id: str, item: dict) -> None:
+        """item must be the version that was add()-ed (its title and flags place it)."""
+        entry = (title_sort_key(item), content_type, content_id)
+        for key, entries in self._lists.items():
+            if matches_filter(key, content_type, item):
+                pos = bisect_left(entries, entry)
+                if pos < len(entries) and entries[pos] == entry:
+                    del entries[pos]
+        for ids in self._recommend.values():
+            ids.get(content_type, set()).discard(content_id)
+
+    def total(self, filter_key: str) -> int:
+        return len(self._lists.get(filter_key, ()))
+
+    def at(self, filter_key: str, idx: int) -> Optional[tuple[str, str]]:
+        """(content_type, content_id) at position idx of the filter, or None."""
+        entries = self._lists.get(filter_key, [])
+        if not 0 <= idx < len(entries):
+            return None
+        _, content_type, content_id = entries[idx]
+        return content_type, content_id
+
+    def position(self, filter_key: str, content_type: str, content_id: str, item: dict) -> Optional[int]:
+        entries = self._lists.get(filter_key, [])
+        entry = (title_sort_key(item), content_type, content_id)
+        pos = bisect_left(entries, entry)
+        if pos < len(entries) and entries[pos] == entry:
+            return pos
+        return None
+
+    def recommend_status(self, content_type: str, content_id: str) -> Optional[bool]:
+        for flag, ids in self._recommend.items():
+            if content_id in ids.get(content_type, ()):
+                return flag
+        return None
+
+    def recommend_ids(self, recommend: bool = True) -> dict[str, set[str]]:
+        return {ctype: set(ids) for ctype, ids in self._recommend[recommend].items() if ids}
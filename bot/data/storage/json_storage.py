@@ -0,0 +1,150 @@
+import os
+import time
+import logging
+import tempfile
+from typing import Iterable, Optional
+
+from bot.data.storage.base import Storage, ItemKey
+from bot.data.storage.serialization import (
+    CODECS,
+    EXTENSIONS,
+    SerializationError,
+    UnsupportedFormatError,
+    decode,
+    encode,
+    get_codec,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class JsonStorage(Storage):
+    """
+    Legacy backend: one file per user, rewritten on every change.
+    Files are written with the configured codec (see serialization.py) and
+    read in whatever format they are in, so switching formats needs no
+    downtime: a library is converted the next time it is written.
+    Writes go to a temp file that replaces the original, so a crash
+    mid-write leaves the previous version intact.
+    """
+
+    def __init__(self, directory: str, fsync: bool = True, codec: str = "json"):
+        self.directory = directory
+        self.fsync = fsync
+        self.codec = get_codec(codec)
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, user_id: int, extension: Optional[str] = None) -> str:
+        return os.path.join(self.directory, f"{user_id}{extension or self.codec.extension}")
+
+    def user_file(self, user_id: int) -> Optional[str]:
+        """Library file of a user, preferring the current codec's extension."""
+        for extension in (self.codec.extension, *EXTENSIONS):
+            path = self._path(user_id, extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _meta_path(self) -> str:
+        # Not a numeric stem, so user_ids() skips it
+        return os.path.join(self.directory, "_meta.json")
+
+    def save_user(self, user_id: int, data: dict) -> None:
+        """Rewrites a whole library in the current format (and drops files in other formats)."""
+        path = self._path(user_id)
+        self._write_file(path, encode(data, self.codec))
+        for extension in EXTENSIONS:
+            stale = self._path(user_id, extension)
+            if stale != path and os.path.exists(stale):
+                os.unlink(stale)
+
+    def _write(self, user_id: int, data: dict) -> None:
+        self.save_user(user_id, data)
+
+    def _write_file(self, path: str, raw: bytes) -> None:
+        name = os.path.basename(path)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(raw)
+                if self.fsync:
+                    file.flush()
+                    os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        if self.fsync and hasattr(os, "O_DIRECTORY"):
+            dir_fd = os.open(self.directory, os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def load_user(self, user_id: int) -> dict:
+        path = self.user_file(user_id)
+        if path is None:
+            return {}
+        with open(path, "rb") as file:
+            raw = file.read()
+        try:
+            return decode(raw)
+        except UnsupportedFormatError as e:
+            # Readable by another deploy: fail loudly rather than start an empty library over it
+            raise UnsupportedFormatError(f"Can't read library file {path}: {e}") from e
+        except SerializationError as e:
+            logger.error("Can't read library file %s: %s", path, e)
+        # Keep the damaged file for manual recovery instead of wiping the library
+        corrupt_path = f"{path}.corrupt-{int(time.time())}"
+        os.replace(path, corrupt_path)
+        logger.error("Corrupt library file for user %s moved to %s", user_id, corrupt_path)
+        return {}
+
+    def get_item(self, user_id: int, content_type: str, content_id: str) -> Optional[dict]:
+        return self.load_user(user_id).get(content_type, {}).get(str(content_id))
+
+    def apply_changes(
+        self,
+        user_id: int,
+        upserts: dict[ItemKey, dict],
+        deletes: Iterable[ItemKey] = (),
+    ) -> None:
+        data = self.load_user(user_id)
+        for (ctype, cid), item in upserts.items():
+            data.setdefault(ctype, {})[str(cid)] = item
+        for ctype, cid in deletes:
+            data.get(ctype, {}).pop(str(cid), None)
+        self._write(user_id, data)
+
+    def write_back(
+        self,
+        user_id: int,
+        data: dict,
+        upserts: dict[ItemKey, dict],
+        deletes: Iterable[ItemKey] = (),
+    ) -> None:
+        # The cache already holds the whole library: no need to re-read the file
+        self._write(user_id, data)
+
+    def user_ids(self) -> list[int]:
+        ids = set()
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext in EXTENSIONS and stem.lstrip("-").isdigit():
+                ids.add(int(stem))
+        return sorted(ids)
+
+    def _load_meta(self) -> dict:
+        try:
+            with open(self._meta_path(), "rb") as file:
+                return decode(file.read())
+        except (FileNotFoundError, SerializationError):
+            return {}
+
+    def get_meta(self, key: str) -> Optional[str]:
+        return self._load_meta().get(key)
+
+    def set_meta(self, key: str, value: str) -> None:
+        meta = self._load_meta()
+        meta[key] = value
+        self._write_file(self._meta_path(), encode(meta, CODECS["json"]))
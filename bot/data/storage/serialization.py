@@ -0,0 +1,114 @@
+import json
+from typing import Callable, NamedTuple
+
+try:
+    import orjson
+except ImportError:  # optional: faster compact JSON
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: binary format
+    msgpack = None
+
+# Header of versioned files: MAGIC + format version byte + codec id byte.
+# Files without it are the legacy pretty-printed JSON.
+MAGIC = b"KL"
+FORMAT_VERSION = 1
+
+
+class SerializationError(ValueError):
+    """Data could not be decoded (corrupt file, unknown version or codec)."""
+
+
+class UnsupportedFormatError(SerializationError):
+    """
+    Data is in a format this deploy can't read (newer version, unknown codec,
+    msgpack not installed). The data itself may be fine: don't discard it.
+    """
+
+
+class Codec(NamedTuple):
+    name: str
+    id: int  # stored in the header; 0 = legacy, no header
+    extension: str
+    dumps: Callable[[dict], bytes]
+    loads: Callable[[bytes], dict]
+
+
+def _json_pretty_dumps(data: dict) -> bytes:
+    return json.dumps(data, ensure_ascii=False, indent=4).encode("utf-8")
+
+
+def _json_compact_dumps(data: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(raw: bytes) -> dict:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _msgpack_dumps(data: dict) -> bytes:
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def _msgpack_loads(raw: bytes) -> dict:
+    return msgpack.unpackb(raw, raw=False)
+
+
+CODECS = {
+    "json": Codec("json", 0, ".json", _json_pretty_dumps, _json_loads),
+    "compact": Codec("compact", 1, ".lib", _json_compact_dumps, _json_loads),
+    "msgpack": Codec("msgpack", 2, ".lib", _msgpack_dumps, _msgpack_loads),
+}
+_BY_ID = {codec.id: codec for codec in CODECS.values()}
+EXTENSIONS = tuple(sorted({codec.extension for codec in CODECS.values()}))
+
+
+def get_codec(name: str) -> Codec:
+    codec = CODECS.get(name)
+    if codec is None:
+        raise RuntimeError(f"Unknown library format: {name!r} (expected one of {', '.join(CODECS)})")
+    if codec.name == "msgpack" and msgpack is None:
+        raise RuntimeError("Library format 'msgpack' needs the msgpack package: pip install msgpack")
+    return codec
+
+
+def encode(data: dict, codec: Codec) -> bytes:
+    body = codec.dumps(data)
+    if codec.id == 0:
+        return body
+    return MAGIC + bytes((FORMAT_VERSION, codec.id)) + body
+
+
+def detect(raw: bytes) -> Codec:
+    """Codec a blob was written with, judging by its header."""
+    if not raw.startswith(MAGIC):
+        return CODECS["json"]
+    if len(raw) < 4:
+        raise SerializationError("Truncated header")
+    version, codec_id = raw[2], raw[3]
+    if version != FORMAT_VERSION:
+        raise UnsupportedFormatError(f"Unsupported format version {version}")
+    codec = _BY_ID.get(codec_id)
+    if codec is None:
+        raise UnsupportedFormatError(f"Unknown codec id {codec_id}")
+    if codec.name == "msgpack" and msgpack is None:
+        raise UnsupportedFormatError("Data is msgpack-encoded but msgpack is not installed")
+    return codec
+
+
+def decode(raw: bytes) -> dict:
+    codec = detect(raw)
+    body = raw if codec.id == 0 else raw[4:]
+    try:
+        data = codec.loads(body)
+    except Exception as e:
+        raise SerializationError(f"Corrupt {codec.name} data: {e}") from e
+    if not isinstance(data, dict):
+        raise SerializationError(f"Expected an object, got {type(data).__name__}")
+    return data
@@ -0,0 +1,225 @@
+import json
+import sqlite3
+import logging
+import threading
+from typing import Iterable, Optional
+
+from bot.data.storage.base import Storage, ItemKey, LIBRARY_FILTERS, display_title, title_sort_key, with_key
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS library (
+    user_id    INTEGER NOT NULL,
+    typename   TEXT    NOT NULL,
+    content_id TEXT    NOT NULL,
+    viewed     INTEGER NOT NULL DEFAULT 0,
+    recommend  INTEGER,
+    title_key  TEXT    NOT NULL DEFAULT '',
+    payload    TEXT    NOT NULL,
+    PRIMARY KEY (user_id, typename, content_id)
+);
+CREATE INDEX IF NOT EXISTS library_filters
+    ON library (user_id, typename, viewed, recommend);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _recommend_column(item: dict) -> Optional[int]:
+    recommend = item.get("recommend")
+    return None if recommend is None else int(bool(recommend))
+
+
+class SqliteStorage(Storage):
+    """
+    One row per library item in a WAL-mode SQLite database.
+    viewed / recommend / title are mirrored into columns so filters and
+    sorting run in SQL instead of parsing every item.
+    """
+
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL in WAL mode is still crash-safe, it only may lose the last commits on power loss
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def load_user(self, user_id: int) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT typename, content_id, payload FROM library WHERE user_id = ?",
+                (user_id,),
+            ).fetchall()
+        data: dict[str, dict] = {}
+        for ctype, cid, payload in rows:
+            data.setdefault(ctype, {})[cid] = json.loads(payload)
+        return data
+
+    def get_item(self, user_id: int, content_type: str, content_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM library WHERE user_id = ? AND typename = ? AND content_id = ?",
+                (user_id, content_type, str(content_id)),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def apply_changes(
+        self,
+        user_id: int,
+        upserts: dict[ItemKey, dict],
+        deletes: Iterable[ItemKey] = (),
+    ) -> None:
+        rows = [
+            (
+                user_id,
+                ctype,
+                str(cid),
+                int(bool(item.get("viewed", False))),
+                _recommend_column(item),
+                title_sort_key(item),
+                json.dumps(item, ensure_ascii=False, separators=(",", ":")),
+            )
+            for (ctype, cid), item in upserts.items()
+        ]
+        with self._lock, self._conn:
+            if rows:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO library "
+                    "(user_id, typename, content_id, viewed, recommend, title_key, payload) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+            self._conn.executemany(
+                "DELETE FROM library WHERE user_id = ? AND typename = ? AND content_id = ?",
+                [(user_id, ctype, str(cid)) for ctype, cid in deletes],
+            )
+
+    @staticmethod
+    def _where(
+        user_id: int,
+        content_type: Optional[str] = None,
+        viewed: Optional[bool] = None,
+        recommend: Optional[bool] = None,
+    ) -> tuple[str, list]:
+        sql = " WHERE user_id = ?"
+        args: list = [user_id]
+        if content_type:
+            sql += " AND typename = ?"
+            args.append(content_type)
+        if viewed is not None:
+            sql += " AND viewed = ?"
+            args.append(int(viewed))
+        if recommend is True:
+            sql += " AND recommend = 1"
+        elif recommend is False:
+            sql += " AND (recommend IS NULL OR recommend = 0)"
+        return sql, args
+
+    def query_items(
+        self,
+        user_id: int,
+        content_type: Optional[str] = None,
+        viewed: Optional[bool] = None,
+        recommend: Optional[bool] = None,
+    ) -> list[dict]:
+        where, args = self._where(user_id, content_type, viewed, recommend)
+        sql = "SELECT typename, content_id, payload FROM library" + where
+        sql += " ORDER BY title_key, typename, content_id"
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [with_key(json.loads(payload), ctype, cid) for ctype, cid, payload in rows]
+
+    def filtered_page(self, user_id: int, filter_key: str, idx: int) -> tuple[Optional[dict], int]:
+        where, args = self._where(user_id, **LIBRARY_FILTERS.get(filter_key, {}))
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM library" + where, args).fetchone()[0]
+            row = None
+            if 0 <= idx < total:
+                row = self._conn.execute(
+                    "SELECT typename, content_id, payload FROM library" + where
+                    + " ORDER BY title_key, typename, content_id LIMIT 1 OFFSET ?",
+                    [*args, idx],
+                ).fetchone()
+        if row is None:
+            return None, total
+        return with_key(json.loads(row[2]), row[0], row[1]), total
+
+    def filtered_total(self, user_id: int, filter_key: str) -> int:
+        where, args = self._where(user_id, **LIBRARY_FILTERS.get(filter_key, {}))
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM library" + where, args).fetchone()[0]
+
+    def recommend_ids(self, user_id: int, recommend: bool = True) -> dict[str, set[str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT typename, content_id FROM library WHERE user_id = ? AND recommend = ?",
+                (user_id, int(recommend)),
+            ).fetchall()
+        ids: dict[str, set[str]] = {}
+        for ctype, cid in rows:
+            ids.setdefault(ctype, set()).add(cid)
+        return ids
+
+    def content_titles(self, content_type: str) -> dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT content_id, payload FROM library WHERE typename = ? GROUP BY content_id",
+                (content_type,),
+            ).fetchall()
+        return {cid: display_title(json.loads(payload)) for cid, payload in rows}
+
+    def holders(self, content_type: str, content_ids: Iterable[str]) -> dict[int, set[str]]:
+        ids = sorted({str(cid) for cid in content_ids})
+        result: dict[int, set[str]] = {}
+        with self._lock:
+            for start in range(0, len(ids), 400):
+                chunk = ids[start:start + 400]
+                rows = self._conn.execute(
+                    "SELECT user_id, content_id FROM library "
+                    f"WHERE typename = ? AND content_id IN ({','.join('?' * len(chunk))})",
+                    (content_type, *chunk),
+                ).fetchall()
+                for user_id, cid in rows:
+                    result.setdefault(user_id, set()).add(cid)
+        return result
+
+    def user_ids(self) -> list[int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT user_id FROM library").fetchall()
+        return [row[0] for row in rows]
+
+    # = = = = = = = = = = = = = = = = MIGRATION = = = = = = = = = = = = = = = =
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def import_from(self, source: Storage) -> int:
+        """Copies every user library from another backend. Returns the number of users copied."""
+        users = 0
+        for user_id in source.user_ids():
+            data = source.load_user(user_id)
+            upserts = {
+                (ctype, str(cid)): item
+                for ctype, content in data.items()
+                for cid, item in content.items()
+            }
+            if upserts:
+                self.apply_changes(user_id, upserts)
+                users += 1
+        return users
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,136 @@
+import os
+import asyncio
+import logging
+from typing import Optional
+
+from bot.data.catalog import content_catalog
+from bot.data.storage import display_title
+from bot.helpers.tasks import chat_tasks
+from hubble.getters import get_info, get_watch_url, watch_title
+
+logger = logging.getLogger(__name__)
+
+# How long a card waits for the LordFilm lookup before rendering without ▶️
+WATCH_URL_DEADLINE = float(os.getenv("WATCH_URL_DEADLINE", "2.0"))
+
+
+async def _store(typename: str, content_id: str, payload: dict, fetched_at: Optional[float] = None) -> None:
+    try:
+        await content_catalog.aput(typename, content_id, payload, fetched_at)
+    except Exception:
+        logger.exception("Failed to store %s:%s in content catalog", typename, content_id)
+
+
+def _store_when_resolved(task: asyncio.Future, typename: str, content_id: str, payload: dict) -> None:
+    """
+    Writes payload to the catalog once, with watch_url if the lookup found one.
+    A failed or cancelled lookup stores the entry as stale (fetched_at=0), so
+    the next view asks again instead of going without ▶️ for CATALOG_MAX_AGE.
+    """
+
+    def _done(t: asyncio.Future) -> None:
+        if t.cancelled() or t.exception():
+            asyncio.ensure_future(_store(typename, content_id, payload, fetched_at=0))
+            return
+        watch_url = t.result()
+        data = {**payload, "watch_url": watch_url} if watch_url else payload
+        asyncio.ensure_future(_store(typename, content_id, data))
+
+    task.add_done_callback(_done)
+
+
+async def _await_watch_url(task: asyncio.Future, deadline: float) -> Optional[str]:
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout=max(deadline, 0))
+    except asyncio.TimeoutError:
+        return None
+    except Exception:
+        logger.warning("LordFilm lookup failed", exc_info=True)
+        return None
+
+
+async def fetch_info_progressive(item: dict) -> tuple[dict, Optional[asyncio.Future]]:
+    """
+    Returns (item merged with detailed info, pending watch_url lookup or None).
+    Reads through the content catalog: Hubble is only asked for titles
+    that are missing or stale there. get_info and the LordFilm lookup run
+    concurrently and the caller decides how long to wait for the latter;
+    the catalog entry is written once the lookup settles.
+    """
+    if item.get("typename") == "person":
+        return item, None
+
+    typename, content_id = item["typename"], str(item["id"])
+    entry = await content_catalog.aget(typename, content_id)
+    if entry and content_catalog.is_fresh(entry):
+        return {**item, **entry.payload}, None
+
+    # The search match usually has the title already, so LordFilm needn't wait for info
+    title = watch_title(item)
+    watch_task = asyncio.ensure_future(get_watch_url(title)) if title else None
+    try:
+        info = await get_info(typename, content_id)
+    except BaseException:
+        if watch_task:
+            watch_task.cancel()
+        raise
+
+    if not info and entry:
+        # Hubble hiccup: a stale card is better than an empty one
+        if watch_task:
+            watch_task.cancel()
+        return {**item, **entry.payload}, None
+
+    merged = {**item, **info}
+    if watch_task is None and watch_title(merged):
+        watch_task = asyncio.ensure_future(get_watch_url(watch_title(merged)))
+
+    if info:
+        if watch_task is not None:
+            _store_when_resolved(watch_task, typename, content_id, dict(merged))
+        else:
+            await _store(typename, content_id, merged)
+    return merged, watch_task
+
+
+async def fetch_full_info(item: dict, deadline: float = WATCH_URL_DEADLINE) -> dict:
+    """
+    Returns item merged with detailed info and watch_url.
+    A watch_url that misses the deadline is left out of the card
+    (it still lands in the catalog once it arrives).
+    """
+    started = asyncio.get_running_loop().time()
+    merged, watch_task = await fetch_info_progressive(item)
+    if watch_task is not None:
+        remaining = deadline - (asyncio.get_running_loop().time() - started)
+        watch_url = await _await_watch_url(watch_task, remaining)
+        if watch_url:
+            merged["watch_url"] = watch_url
+    return merged
+
+
+def has_info(content_data: dict) -> bool:
+    """False for a bare {id, typename} stub left by an empty Hubble answer."""
+    return bool(display_title(content_data))
+
+
+async def _refresh_if_stale(item: dict) -> None:
+    # Only the identity goes in: the joined library item also carries the user's own fields
+    base = {key: item[key] for key in ("id", "typename", "title_russian", "title_original") if item.get(key)}
+    try:
+        await fetch_info_progressive(base)
+    except Exception:
+        logger.debug("Catalog refresh failed for %s:%s", item.get("typename"), item.get("id"), exc_info=True)
+
+
+def refresh_in_background(chat_id: int, item: dict) -> None:
+    """
+    Re-fetches the catalog payload of a library item shown to the user if it
+    is stale (e.g. migrated with fetched_at=0). The card on screen keeps the
+    old data; the next view gets the fresh one.
+    """
+    if item.get("typename") not in ("film", "tvseries"):
+        return
+    name = f"{item['typename']}:{item['id']}"
+    if name not in chat_tasks.pending_names(chat_id, "catalog"):
+        chat_tasks.spawn(chat_id, "catalog", _refresh_if_stale(item), name=name)
@@ -0,0 +1,136 @@
+import os
+import asyncio
+import datetime
+import logging
+from html import escape
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+
+from bot.data.aio import get_content_holders
+from bot.data.calendar import release_calendar
+from bot.data.notifications import notification_store
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_ENABLED = os.getenv("NOTIFY_ENABLED", "1").lower() not in ("0", "false", "no")
+# Local hour of the daily pass (rather than a burst at midnight)
+NOTIFY_HOUR = int(os.getenv("NOTIFY_HOUR", "10"))
+# Messages per second; Telegram starts answering 429 at about 30/s
+NOTIFY_RATE = float(os.getenv("NOTIFY_RATE", "20"))
+# "Already notified" records are kept this many days
+NOTIFY_KEEP_DAYS = 7
+
+
+class ReleaseNotifier:
+    """
+    Once a day pushes "new episodes today" to subscribed users: series whose
+    next date in the release calendar is today, one message per user,
+    sent in rate-limited batches.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.failed = 0
+
+    async def _send(self, bot: Bot, user_id: int, titles: list[str]) -> bool:
+        text = "<b>🔔 Сегодня выходят новые серии:</b>\n\n" + "\n".join(escape(title) for title in titles)
+        for attempt in range(2):
+            try:
+                await bot.send_message(user_id, text, parse_mode="HTML")
+                return True
+            except TelegramRetryAfter as e:
+                if attempt:
+                    break
+                logger.warning("Notifications: flood control, waiting %ss", e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except TelegramForbiddenError:
+                # Blocked the bot or deleted the chat: stop trying
+                await notification_store.aunsubscribe(user_id)
+                return False
+            except TelegramAPIError:
+                logger.warning("Notifications: sending to %s failed", user_id, exc_info=True)
+                break
+        return False
+
+    async def run_once(self, bot: Bot, day: Optional[datetime.date] = None) -> int:
+        """Notifies about releases on day (today). Safe to re-run. Returns messages sent."""
+        day_iso = (day or datetime.date.today()).isoformat()
+        releases = {entry.series_id: entry.title for entry in await release_calendar.areleased_on(day_iso)}
+        if not releases:
+            return 0
+        subscribers = await notification_store.asubscribers()
+        if not subscribers:
+            return 0
+
+        holders = await get_content_holders("tvseries", releases)
+        already = await notification_store.asent_on(day_iso)
+        outbox = {
+            user_id: sorted(sid for sid in ids if (user_id, sid) not in already)
+            for user_id, ids in holders.items()
+            if user_id in subscribers
+        }
+        outbox = {user_id: ids for user_id, ids in outbox.items() if ids}
+
+        # One batch per second, each as large as the rate allows
+        users = list(outbox)
+        batch = max(1, int(NOTIFY_RATE))
+        loop = asyncio.get_running_loop()
+        sent = 0
+        for start in range(0, len(users), batch):
+            chunk = users[start:start + batch]
+            started = loop.time()
+            results = await asyncio.gather(*(
+                self._send(bot, user_id, [releases[sid] for sid in outbox[user_id]]) for user_id in chunk
+            ))
+            delivered = [user_id for user_id, ok in zip(chunk, results) if ok]
+            await notification_store.amark_sent(
+                [(user_id, sid) for user_id in delivered for sid in outbox[user_id]], day_iso
+            )
+            sent += len(delivered)
+            self.failed += len(chunk) - len(delivered)
+            if start + batch < len(users):
+                await asyncio.sleep(max(0.0, 1.0 - (loop.time() - started)))
+
+        self.sent += sent
+        keep_from = datetime.date.fromisoformat(day_iso) - datetime.timedelta(days=NOTIFY_KEEP_DAYS)
+        await notification_store.aprune_sent(keep_from.isoformat())
+        if sent:
+            logger.info("Notifications: %d users notified about %d releases", sent, len(releases))
+        return sent
+
+    async def _loop(self, bot: Bot) -> None:
+        while True:
+            now = datetime.datetime.now()
+            run_at = now.replace(hour=NOTIFY_HOUR, minute=0, second=0, microsecond=0)
+            if now >= run_at:
+                # Today's pass (or a catch-up after a restart; already sent ones are skipped)
+                try:
+                    await self.run_once(bot)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Notification pass failed")
+                run_at += datetime.timedelta(days=1)
+            await asyncio.sleep((run_at - datetime.datetime.now()).total_seconds())
+
+    def start(self, bot: Bot) -> None:
+        if NOTIFY_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._loop(bot), name="release-notifier")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "failed": self.failed}
+
+
+release_notifier = ReleaseNotifier()
@@ -0,0 +1,192 @@
+import os
+import time
+import asyncio
+import datetime
+import logging
+from typing import Optional
+
+from bot.data.aio import get_library_titles
+from bot.data.calendar import CalendarEntry, release_calendar
+from hubble.getters import get_series_release
+from hubble.series_dates import parse_release_date
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_ENABLED = os.getenv("CALENDAR_ENABLED", "1").lower() not in ("0", "false", "no")
+# How often the scheduler looks for due series, and how many it refreshes per pass
+CALENDAR_TICK = float(os.getenv("CALENDAR_TICK", "60"))
+CALENDAR_BATCH = int(os.getenv("CALENDAR_BATCH", "50"))
+CALENDAR_CONCURRENCY = int(os.getenv("CALENDAR_CONCURRENCY", "4"))
+# Libraries are scanned for newly added series this often
+CALENDAR_DISCOVER_INTERVAL = float(os.getenv("CALENDAR_DISCOVER_INTERVAL", "600"))
+# A failed refresh is retried after this long
+CALENDAR_RETRY = float(os.getenv("CALENDAR_RETRY", "1800"))
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Recheck cadence of series with a far-away or not yet dated next episode,
+# and of finished series (nothing announced, next season not in production)
+CALENDAR_SLOW_REFRESH = float(os.getenv("CALENDAR_SLOW_REFRESH", str(7 * DAY)))
+CALENDAR_FINISHED_REFRESH = float(os.getenv("CALENDAR_FINISHED_REFRESH", str(30 * DAY)))
+
+
+def refresh_delay(next_date: Optional[str], next_season_in_prod: bool, now: Optional[float] = None) -> float:
+    """
+    Seconds until a series is worth asking Hubble about again: often when an
+    episode is close, on a slow cadence when it is far away, rarely for
+    finished shows. Never later than the day after a known next date (or the
+    start of a known month/year), so a passed date is replaced quickly.
+    """
+    now = time.time() if now is None else now
+    release = parse_release_date(next_date)
+    if release is None:
+        # Nothing announced: either waiting for a date or finished
+        return CALENDAR_SLOW_REFRESH if next_season_in_prod else CALENDAR_FINISHED_REFRESH
+
+    today = datetime.date.fromtimestamp(now)
+    day = release.as_date()
+    if day is None:
+        # Only a month or a year is known: slow until that period starts
+        start = datetime.date(release.year, release.month or 1, 1)
+        if start <= today:
+            return 3 * DAY
+        until_start = datetime.datetime.combine(start, datetime.time()).timestamp() - now
+        return max(min(CALENDAR_SLOW_REFRESH, until_start), HOUR)
+
+    days_left = (day - today).days
+    if days_left <= 1:
+        delay = 3 * HOUR
+    elif days_left <= 7:
+        delay = 12 * HOUR
+    elif days_left <= 30:
+        delay = DAY
+    else:
+        delay = CALENDAR_SLOW_REFRESH
+    day_after = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time()).timestamp()
+    return max(min(delay, day_after - now), HOUR)
+
+
+def is_stale(entry: CalendarEntry, now: Optional[float] = None) -> bool:
+    """
+    Whether an entry's data could have changed: never fetched, due, or its
+    next date has passed (unless a failed refresh was just postponed).
+    """
+    now = time.time() if now is None else now
+    if entry.fetched_at is None or entry.next_refresh <= now:
+        return True
+    release = parse_release_date(entry.next_date)
+    day = release.as_date() if release else None
+    return day is not None and day < datetime.date.fromtimestamp(now) and not entry.failures
+
+
+async def refresh_series(series_id: str, title: str) -> Optional[CalendarEntry]:
+    """
+    Fetches dates of one series into the calendar. On failure (including an
+    empty answer: Hubble returns {} for errors) the old entry stays and is
+    retried later; returns None then.
+    """
+    try:
+        release = await get_series_release(title)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.warning("Release calendar: refresh of %s (%s) failed", title, series_id, exc_info=True)
+        release = None
+    else:
+        if release is None:
+            logger.warning("Release calendar: empty answer for %s (%s)", title, series_id)
+    if release is None:
+        await release_calendar.apostpone(series_id, time.time() + CALENDAR_RETRY)
+        return None
+
+    next_date = release.next_release()
+    next_date = next_date.iso if next_date else None
+    next_season_in_prod = release.in_production
+    now = time.time()
+    entry = CalendarEntry(
+        series_id=str(series_id),
+        title=title,
+        next_date=next_date,
+        next_season_in_prod=next_season_in_prod,
+        production_year=release.production_year,
+        fetched_at=now,
+        next_refresh=now + refresh_delay(next_date, next_season_in_prod, now),
+    )
+    await release_calendar.aput(entry)
+    return entry
+
+
+class ReleaseScheduler:
+    """
+    Background loop keeping the release calendar fresh: registers series found
+    in libraries and refreshes the due ones with bounded concurrency.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._discovered_at = 0.0
+        self.refreshed = 0
+        self.failed = 0
+
+    async def discover(self) -> int:
+        """
+        Registers series from all libraries that the calendar doesn't know yet
+        and drops the ones no library holds any more, so they stop being refreshed.
+        """
+        titles = await get_library_titles("tvseries")
+        new = await release_calendar.aregister({sid: title for sid, title in titles.items() if title})
+        gone = await release_calendar.aforget_except(titles)
+        self._discovered_at = time.time()
+        if new or gone:
+            logger.info("Release calendar: %d new series, %d dropped", new, gone)
+        return new
+
+    async def run_once(self) -> int:
+        """One scheduler pass. Returns how many series were refreshed."""
+        if time.time() - self._discovered_at >= CALENDAR_DISCOVER_INTERVAL:
+            await self.discover()
+        due = await release_calendar.adue(limit=CALENDAR_BATCH)
+        if not due:
+            return 0
+
+        slots = asyncio.Semaphore(CALENDAR_CONCURRENCY)
+
+        async def _refresh(entry: CalendarEntry):
+            async with slots:
+                return await refresh_series(entry.series_id, entry.title)
+
+        results = await asyncio.gather(*(_refresh(entry) for entry in due))
+        ok = sum(result is not None for result in results)
+        self.refreshed += ok
+        self.failed += len(results) - ok
+        return ok
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Release calendar pass failed")
+            await asyncio.sleep(CALENDAR_TICK)
+
+    def start(self) -> None:
+        if CALENDAR_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="release-calendar")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"refreshed": self.refreshed, "failed": self.failed}
+
+
+release_scheduler = ReleaseScheduler()
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from typing import Any, Coroutine, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ChatTasks:
+    """Background tasks grouped by (chat_id, kind), so a chat's work can be cancelled together."""
+
+    def __init__(self):
+        self._tasks: dict[tuple[int, str], set[asyncio.Task]] = {}
+
+    def spawn(self, chat_id: int, kind: str, coro: Coroutine, name: str = None) -> asyncio.Task:
+        key = (chat_id, kind)
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.setdefault(key, set()).add(task)
+
+        def _forget(t: asyncio.Task) -> None:
+            tasks = self._tasks.get(key)
+            if tasks is not None:
+                tasks.discard(t)
+                if not tasks:
+                    del self._tasks[key]
+
+        task.add_done_callback(_forget)
+        return task
+
+    def cancel(self, chat_id: int, kind: str, keep: set[str] = frozenset()) -> int:
+        """
+        Cancels pending tasks of this kind for the chat, except those named in keep.
+        Returns how many were cancelled.
+        """
+        cancelled = 0
+        for task in list(self._tasks.get((chat_id, kind), ())):
+            if task.get_name() not in keep:
+                task.cancel()
+                cancelled += 1
+        return cancelled
+
+    async def run_exclusive(self, chat_id: int, kind: str, coro: Coroutine) -> Optional[Any]:
+        """
+        Runs coro as the only task of its kind for the chat: a newer call cancels
+        the older one, including its in-flight Hubble / OpenRouter requests.
+        Returns coro's result, or None if it was superseded.
+        """
+        if self.cancel(chat_id, kind):
+            logger.info("Cancelled stale %s task for chat %s", kind, chat_id)
+        task = self.spawn(chat_id, kind, coro)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task.cancelled() and not asyncio.current_task().cancelling():
+                return None
+            raise
+
+    def pending_names(self, chat_id: int, kind: str) -> set[str]:
+        return {task.get_name() for task in self._tasks.get((chat_id, kind), ())}
+
+
+chat_tasks = ChatTasks()
@@ -0,0 +1,73 @@
+import logging
+from typing import Optional
+
+import aiohttp
+from aiohttp import ClientSession
+
+from hubble.utils import (
+    HUBBLE_POOL_LIMIT,
+    HUBBLE_POOL_LIMIT_PER_HOST,
+    HUBBLE_KEEPALIVE_TIMEOUT,
+    HUBBLE_DNS_CACHE_TTL,
+    HUBBLE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class HubbleClient:
+    """
+    Long-lived aiohttp session for the Hubble API.
+    Opened on dispatcher startup and closed on shutdown, so every getter
+    reuses pooled keep-alive connections instead of a fresh TCP connect.
+    """
+
+    def __init__(
+        self,
+        limit: int = HUBBLE_POOL_LIMIT,
+        limit_per_host: int = HUBBLE_POOL_LIMIT_PER_HOST,
+        keepalive_timeout: float = HUBBLE_KEEPALIVE_TIMEOUT,
+        dns_cache_ttl: int = HUBBLE_DNS_CACHE_TTL,
+        timeout: float = HUBBLE_TIMEOUT,
+    ):
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._dns_cache_ttl = dns_cache_ttl
+        self._timeout = timeout
+        self._session: Optional[ClientSession] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    async def start(self) -> None:
+        if self.is_open:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self._limit,
+            limit_per_host=self._limit_per_host,
+            keepalive_timeout=self._keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self._dns_cache_ttl,
+        )
+        self._session = ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self._timeout),
+        )
+        logger.info("Hubble client session opened")
+
+    async def close(self) -> None:
+        if self.is_open:
+            await self._session.close()
+            logger.info("Hubble client session closed")
+        self._session = None
+
+    async def get_session(self) -> ClientSession:
+        """Returns the shared session, opening it lazily if startup was skipped."""
+        if not self.is_open:
+            await self.start()
+        return self._session
+
+
+hubble_client = HubbleClient()
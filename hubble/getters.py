@@ -1,6 +1,11 @@
-import aiohttp
+import asyncio
+from typing import Optional
+
 from aiohttp import ClientSession
 
+from hubble.cache import response_cache
+from hubble.client import hubble_client
+from hubble.series_dates import SeriesDates, has_dates, normalize_series_dates
 from hubble.utils import (
     SEARCH_URL,
     INFO_URL,
@@ -10,6 +15,11 @@ from hubble.utils import (
     MEDIA_POSTS_URL,
     SERIES_DATES_URL,
     LORDFILM_SEARCH_URL,
+    HUBBLE_CACHE_TTL_INFO,
+    HUBBLE_CACHE_TTL_SIMILARS,
+    HUBBLE_CACHE_TTL_SEARCH,
+    HUBBLE_CACHE_TTL_LORDFILM,
+    HUBBLE_CACHE_TTL_DATES,
 )
 
 
@@ -27,52 +37,157 @@ async def fetch_json(session: ClientSession, url: str, params: dict) -> dict:
             return {}
 
 
+def _cache_key(url: str, params: dict) -> tuple:
+    return (url, tuple(sorted((k, str(v)) for k, v in params.items())))
+
+
+# = = = = = = = = = = = = = = = = SINGLE-FLIGHT = = = = = = = = = = = = = = = =
+
+# key -> [shared task, number of callers awaiting it]
+_inflight: dict[tuple, list] = {}
+coalesce_stats = {"requests": 0, "deduplicated": 0}
+
+
+async def _fetch(url: str, params: dict):
+    session = await hubble_client.get_session()
+    return await fetch_json(session, url, params)
+
+
+async def _single_flight(key: tuple, url: str, params: dict):
+    """
+    Concurrent calls with the same key share one upstream request.
+    A cancelled caller only cancels the request if nobody else awaits it.
+    """
+    coalesce_stats["requests"] += 1
+    while True:
+        flight = _inflight.get(key)
+        if flight is None:
+            flight = _new_flight(key, url, params)
+        else:
+            coalesce_stats["deduplicated"] += 1
+
+        task = flight[0]
+        flight[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled() and not asyncio.current_task().cancelling():
+                # Joined a request its previous sole caller had just cancelled:
+                # that's not our cancellation, so start a fresh request
+                if _inflight.get(key) is flight:
+                    del _inflight[key]
+                continue
+            if flight[1] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            flight[1] -= 1
+
+
+def _new_flight(key: tuple, url: str, params: dict) -> list:
+    task = asyncio.ensure_future(_fetch(url, params))
+    flight = _inflight[key] = [task, 0]
+    task.add_done_callback(
+        lambda _: _inflight.pop(key, None) if _inflight.get(key) is flight else None
+    )
+    return flight
+
+
+async def _get(url: str, params: dict, ttl: float = 0):
+    """
+    Fetches url through the shared session, coalescing identical in-flight calls.
+    With ttl > 0 non-empty responses are served from / stored in response_cache.
+    """
+    key = _cache_key(url, params)
+    if ttl:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+
+    result = await _single_flight(key, url, params)
+
+    if ttl and result:
+        response_cache.set(key, result, ttl)
+    return result
+
+
+def invalidate_info(content_type: str, id: int) -> None:
+    """Drops cached info and similars for a single title."""
+    for url in (INFO_URL, SIMILARS_URL):
+        response_cache.invalidate(_cache_key(url, {"content_type": content_type, "id": id}))
+
+
+def invalidate_search() -> int:
+    """Drops every cached search and LordFilm lookup."""
+    return response_cache.invalidate_where(
+        lambda key: key[0] in (SEARCH_URL, LORDFILM_SEARCH_URL)
+    )
+
+
 async def get_search(search_query: str) -> dict:
-    async with aiohttp.ClientSession() as session:
-        return await fetch_json(session, SEARCH_URL, {"search_query": search_query})
+    return await _get(SEARCH_URL, {"search_query": search_query}, ttl=HUBBLE_CACHE_TTL_SEARCH)
 
 
 async def get_info(content_type: str, id: int) -> dict:
-    async with aiohttp.ClientSession() as session:
-        return await fetch_json(
-            session, INFO_URL, {"content_type": content_type, "id": id}
-        )
+    return await _get(INFO_URL, {"content_type": content_type, "id": id}, ttl=HUBBLE_CACHE_TTL_INFO)
 
 
 async def get_similars(content_type: str, id: int) -> list:
-    async with aiohttp.ClientSession() as session:
-        return await fetch_json(
-            session, SIMILARS_URL, {"content_type": content_type, "id": id}
-        )
+    return await _get(SIMILARS_URL, {"content_type": content_type, "id": id}, ttl=HUBBLE_CACHE_TTL_SIMILARS)
 
 
 async def get_person(id: int) -> dict:
-    async with aiohttp.ClientSession() as session:
-        return await fetch_json(session, PERSON_URL, {"id": id})
+    return await _get(PERSON_URL, {"id": id})
 
 
 async def get_trivias(content_type: str, id: int) -> list:
-    async with aiohttp.ClientSession() as session:
-        return await fetch_json(
-            session, TRIVIAS_URL, {"content_type": content_type, "id": id}
-        )
+    return await _get(TRIVIAS_URL, {"content_type": content_type, "id": id})
 
 
 async def get_media_posts(content_type: str, id: int) -> list:
-    async with aiohttp.ClientSession() as session:
-        return await fetch_json(
-            session, MEDIA_POSTS_URL, {"content_type": content_type, "id": id}
-        )
+    return await _get(MEDIA_POSTS_URL, {"content_type": content_type, "id": id})
 
 
 async def get_series_dates(title: str) -> dict:
-    async with aiohttp.ClientSession() as session:
-        return await fetch_json(session, SERIES_DATES_URL, {"title": title})
+    return await _get(SERIES_DATES_URL, {"title": title})
+
+
+async def get_series_release(title: str) -> Optional[SeriesDates]:
+    """
+    get_series_dates normalized into a SeriesDates, cached as such, so the
+    season/episode dump is parsed once per title. None if Hubble had nothing
+    (or answered without any dates fields), so it is never taken for a
+    finished show.
+    """
+    key = (SERIES_DATES_URL, "normalized", title)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+
+    data = await get_series_dates(title)
+    if not has_dates(data):
+        return None
+    release = normalize_series_dates(data)
+    response_cache.set(key, release, HUBBLE_CACHE_TTL_DATES)
+    return release
 
 
 async def get_lordfilm_search(search_query: str) -> dict:
-    async with aiohttp.ClientSession() as session:
-        return await fetch_json(session, LORDFILM_SEARCH_URL, {"search_query": search_query})
+    return await _get(LORDFILM_SEARCH_URL, {"search_query": search_query}, ttl=HUBBLE_CACHE_TTL_LORDFILM)
+
+
+def watch_title(content_data: dict) -> str:
+    """Title used for the LordFilm lookup, or "" if content can't have a watch link."""
+    if content_data.get("typename") not in ("film", "tvseries"):
+        return ""
+    return content_data.get("title_russian") or content_data.get("title_original", "")
+
+
+async def get_watch_url(title: str) -> Optional[str]:
+    if not title:
+        return None
+    lf_result = await get_lordfilm_search(title)
+    return (lf_result or {}).get("best", {}).get("watch_url")
 
 
 async def enrich_with_watch_url(content_data: dict) -> dict:
@@ -81,13 +196,7 @@ async def enrich_with_watch_url(content_data: dict) -> dict:
     Если не находит — возвращает данные без изменений.
     Работает только для film/tvseries.
     """
-    if content_data.get("typename") not in ("film", "tvseries"):
-        return content_data
-    title = content_data.get("title_russian") or content_data.get("title_original", "")
-    if not title:
-        return content_data
-    lf_result = await get_lordfilm_search(title)
-    watch_url = (lf_result or {}).get("best", {}).get("watch_url")
+    watch_url = await get_watch_url(watch_title(content_data))
     if watch_url:
         content_data["watch_url"] = watch_url
     return content_data
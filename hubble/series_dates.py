@@ -0,0 +1,143 @@
+import datetime
+from bisect import bisect_left
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+# Precision of a release date
+DAY = "day"
+MONTH = "month"
+YEAR = "year"
+
+# Status of a series
+ONGOING = "ongoing"              # a future date is known
+IN_PRODUCTION = "in_production"  # next season is announced, no date yet
+FINISHED = "finished"
+
+
+class ReleaseDate(NamedTuple):
+    """
+    A release date as precise as Hubble knows it: month and day are 0 when
+    unknown. An unknown date is None.
+    """
+    year: int
+    month: int = 0
+    day: int = 0
+
+    @property
+    def precision(self) -> str:
+        if self.day:
+            return DAY
+        if self.month:
+            return MONTH
+        return YEAR
+
+    @property
+    def iso(self) -> str:
+        """Hubble's own notation: "2025-03-14", "2025-03-00" or "2025-00-00"."""
+        return f"{self.year:04d}-{self.month:02d}-{self.day:02d}"
+
+    def as_date(self) -> Optional[datetime.date]:
+        return datetime.date(self.year, self.month, self.day) if self.day else None
+
+    def is_past(self, today: datetime.date) -> bool:
+        """Whether the whole day / month / year is over by today."""
+        if self.day:
+            return self.as_date() < today
+        if self.month:
+            return (self.year, self.month) < (today.year, today.month)
+        return self.year < today.year
+
+
+def parse_release_date(raw) -> Optional[ReleaseDate]:
+    """
+    "YYYY-MM-DD", "YYYY-MM-00", "YYYY-00-00" or "YYYY"; None for anything
+    else, including impossible dates.
+    """
+    return _parse(raw) if isinstance(raw, str) else None
+
+
+@lru_cache(maxsize=4096)
+def _parse(raw: str) -> Optional[ReleaseDate]:
+    parts = raw.strip().split("-")
+    if len(parts) == 1:
+        parts += ["0", "0"]
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return None
+    year, month, day = (int(part) for part in parts)
+    if not year or (day and not month) or month > 12:
+        return None
+    if day:
+        try:
+            datetime.date(year, month, day)
+        except ValueError:
+            return None
+    return ReleaseDate(year, month, day)
+
+
+class SeriesDates(NamedTuple):
+    """
+    Normalized get_series_dates answer: the announced date, whether the next
+    season is in production, the season count and every known episode date
+    (sorted ordinals). Immutable, so it is safe to cache and share.
+    """
+    announced: Optional[ReleaseDate]
+    in_production: bool
+    seasons: int
+    production_year: Optional[str]
+    episode_dates: tuple[int, ...]
+
+    def next_episode(self, today: Optional[datetime.date] = None) -> Optional[datetime.date]:
+        """
+        First known episode on or after today: on release day the episode
+        still counts as the next one (the release calendar and the
+        notifications rely on that until the day is over).
+        """
+        today = today or datetime.date.today()
+        i = bisect_left(self.episode_dates, today.toordinal())
+        return datetime.date.fromordinal(self.episode_dates[i]) if i < len(self.episode_dates) else None
+
+    def next_release(self, today: Optional[datetime.date] = None) -> Optional[ReleaseDate]:
+        """
+        Hubble's announced date, or else the first episode of any season from
+        today on. An announced date that is already over is ignored: it isn't
+        the next release, and keeping it would make the entry stale forever.
+        """
+        today = today or datetime.date.today()
+        if self.announced is not None and not self.announced.is_past(today):
+            return self.announced
+        day = self.next_episode(today)
+        return ReleaseDate(day.year, day.month, day.day) if day else None
+
+    def status(self, today: Optional[datetime.date] = None) -> str:
+        if self.next_release(today) is not None:
+            return ONGOING
+        return IN_PRODUCTION if self.in_production else FINISHED
+
+
+# Fields of a real get_series_dates answer; one without any of them
+# (an error body, {} from a failed request) says nothing about the series
+DATES_FIELDS = ("new_seria_date", "seasons", "is_next_season_in_prod")
+
+
+def has_dates(data) -> bool:
+    return isinstance(data, dict) and any(field in data for field in DATES_FIELDS)
+
+
+def normalize_series_dates(data: dict) -> SeriesDates:
+    """Turns a raw get_series_dates answer into a SeriesDates."""
+    data = data or {}
+    seasons = data.get("seasons") or []
+    episode_dates = set()
+    for season in seasons:
+        for episode in season.get("episodes") or []:
+            release = parse_release_date(episode.get("release_date"))
+            if release is not None and release.day:
+                episode_dates.add(release.as_date().toordinal())
+    production_year = data.get("production_year")
+    return SeriesDates(
+        announced=parse_release_date(data.get("new_seria_date")),
+        in_production=bool(data.get("is_next_season_in_prod")),
+        seasons=len(seasons),
+        production_year=str(production_year) if production_year else None,
+        episode_dates=tuple(sorted(episode_dates)),
+    )
@@ -10,3 +10,19 @@ TRIVIAS_URL = BASE_URL + "trivias"
 MEDIA_POSTS_URL = BASE_URL + "media_posts"
 SERIES_DATES_URL = BASE_URL + "series_dates"
 LORDFILM_SEARCH_URL = BASE_URL + "lordfilm_search"
+
+# Connection pool of the shared Hubble client
+HUBBLE_POOL_LIMIT = int(os.getenv("HUBBLE_POOL_LIMIT", "100"))
+HUBBLE_POOL_LIMIT_PER_HOST = int(os.getenv("HUBBLE_POOL_LIMIT_PER_HOST", "30"))
+HUBBLE_KEEPALIVE_TIMEOUT = float(os.getenv("HUBBLE_KEEPALIVE_TIMEOUT", "60"))
+HUBBLE_DNS_CACHE_TTL = int(os.getenv("HUBBLE_DNS_CACHE_TTL", "300"))
+HUBBLE_TIMEOUT = float(os.getenv("HUBBLE_TIMEOUT", "30"))
+
+# In-process response cache in front of the getters
+HUBBLE_CACHE_ENABLED = os.getenv("HUBBLE_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+HUBBLE_CACHE_SIZE = int(os.getenv("HUBBLE_CACHE_SIZE", "2000"))
+HUBBLE_CACHE_TTL_INFO = float(os.getenv("HUBBLE_CACHE_TTL_INFO", "21600"))
+HUBBLE_CACHE_TTL_SIMILARS = float(os.getenv("HUBBLE_CACHE_TTL_SIMILARS", "21600"))
+HUBBLE_CACHE_TTL_SEARCH = float(os.getenv("HUBBLE_CACHE_TTL_SEARCH", "300"))
+HUBBLE_CACHE_TTL_LORDFILM = float(os.getenv("HUBBLE_CACHE_TTL_LORDFILM", "3600"))
+HUBBLE_CACHE_TTL_DATES = float(os.getenv("HUBBLE_CACHE_TTL_DATES", "3600"))
@@ -9,8 +9,19 @@ load_dotenv()  # must happen before any os.getenv() calls in other modules
 from aiogram import Bot, Dispatcher
 
 from bot.data import get_token
+from bot.data import aio as storage_aio
+from bot.data.handler import close_storage
+from bot.data.catalog import content_catalog
+from bot.data.locks import user_locks
+from bot.data.calendar import release_calendar
+from bot.helpers.release_calendar import release_scheduler
+from bot.data.notifications import notification_store
+from bot.helpers.notifications import release_notifier
 from bot.passphrase import PassphraseMiddleware
-from bot.commands import start, search, my_list, suggest, help, dates, inline
+from bot.commands import start, search, my_list, suggest, help, dates, inline, notify
+from hubble.cache import response_cache
+from hubble.client import hubble_client
+from hubble.getters import coalesce_stats
 
 
 # LOGGER SETUP
@@ -49,12 +60,40 @@ dp.include_router(start.router)
 dp.include_router(my_list.router)
 dp.include_router(suggest.router)  # before search: handles "🎲 Что посмотреть?" text
 dp.include_router(dates.router)
+dp.include_router(notify.router)
 dp.include_router(help.router)
 dp.include_router(inline.router)   # inline queries (@bot query)
 dp.include_router(search.router)   # free-text catch-all must be last
 logger.info("Routers added")
 
 
+# LIFECYCLE
+async def on_startup():
+    await hubble_client.start()
+    release_scheduler.start()
+    release_notifier.start(bot)
+
+
+async def on_shutdown():
+    await release_notifier.stop()
+    await release_scheduler.stop()
+    await hubble_client.close()
+    logger.info("Hubble cache stats: %s", response_cache.stats())
+    logger.info("Hubble coalescing stats: %s", coalesce_stats)
+    logger.info("Library lock stats: %s", user_locks.stats())
+    logger.info("Release calendar stats: %s", release_scheduler.stats())
+    logger.info("Notification stats: %s", release_notifier.stats())
+    content_catalog.close()
+    release_calendar.close()
+    notification_store.close()
+    storage_aio.shutdown()
+    close_storage()
+
+
+dp.startup.register(on_startup)
+dp.shutdown.register(on_shutdown)
+
+
 async def main():
     await dp.start_polling(bot)
     logger.info("Bot started")
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+import pytest
+
+from bot.data import aio, handler
+from bot.data.storage import SqliteStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "library.sqlite3"))
+    handler.set_storage(storage)
+    yield storage
+    handler.set_storage(None)
+    storage.close()
+
+
+def _record_threads(storage, calls):
+    for name in ("load_user", "get_item", "apply_changes"):
+        original = getattr(storage, name)
+
+        def wrapper(*args, _original=original, _name=name, **kwargs):
+            calls.append((_name, threading.current_thread() is threading.main_thread()))
+            return _original(*args, **kwargs)
+
+        setattr(storage, name, wrapper)
+
+
+def test_user_library_commits_off_the_event_loop(storage):
+    storage.apply_changes(1, {("film", "1"): {"title": "A", "viewed": False}})
+    calls = []
+    _record_threads(storage, calls)
+
+    async def main():
+        async with aio.user_library(1) as lib:
+            assert lib.get("film", "1")["title"] == "A"
+            assert lib.get("film", "2") is None
+            assert [cid for _, cid, _ in lib.items("film")] == ["1"]
+            lib.update("film", "1", viewed=True)
+            lib.put("tvseries", "7", {"title": "B"})
+
+    asyncio.run(main())
+
+    # One load and one commit, both in the storage pool
+    assert calls == [("load_user", False), ("apply_changes", False)]
+    assert storage.get_item(1, "film", "1")["viewed"] is True
+    assert storage.get_item(1, "tvseries", "7")["title"] == "B"
+
+
+def test_user_library_discards_changes_on_error(storage):
+    async def main():
+        async with aio.user_library(1) as lib:
+            lib.put("film", "1", {"title": "A"})
+            raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(main())
+    assert storage.load_user(1) == {}
+
+
+def test_user_library_holds_the_user_lock(storage):
+    storage.apply_changes(1, {("film", "1"): {"title": "A", "viewed": False}})
+    order = []
+
+    async def transaction():
+        async with aio.user_library(1) as lib:
+            order.append("transaction")
+            await asyncio.sleep(0.05)
+            lib.update("film", "1", user_review="ok")
+        order.append("committed")
+
+    async def mutation():
+        await asyncio.sleep(0.01)
+        await aio.mark_viewed_only(1, "film", "1")
+        order.append("mutation")
+
+    async def main():
+        await asyncio.gather(transaction(), mutation())
+
+    asyncio.run(main())
+    assert order == ["transaction", "committed", "mutation"]
+    item = storage.get_item(1, "film", "1")
+    assert item["viewed"] is True and item["user_review"] == "ok"
@@ -0,0 +1,61 @@
+import datetime
+
+from hubble.series_dates import (
+    FINISHED,
+    IN_PRODUCTION,
+    ONGOING,
+    ReleaseDate,
+    has_dates,
+    normalize_series_dates,
+    parse_release_date,
+)
+
+TODAY = datetime.date(2026, 10, 18)
+
+
+def _episodes(*days: int) -> dict:
+    return {"seasons": [{"episodes": [
+        {"release_date": (TODAY + datetime.timedelta(days=d)).isoformat()} for d in days
+    ]}]}
+
+
+def test_parse_release_date():
+    assert parse_release_date("2025-03-14") == ReleaseDate(2025, 3, 14)
+    assert parse_release_date("2025-03-00").precision == "month"
+    assert parse_release_date("2025") == parse_release_date("2025-00-00") == ReleaseDate(2025)
+    for raw in ("2025-02-30", "2025-00-05", "soon", "", None):
+        assert parse_release_date(raw) is None
+
+
+def test_next_episode_includes_today():
+    dates = normalize_series_dates(_episodes(-7, 0, 7))
+    assert dates.next_episode(TODAY) == TODAY
+    assert dates.next_episode(TODAY + datetime.timedelta(days=1)) == TODAY + datetime.timedelta(days=7)
+    assert dates.next_episode(TODAY + datetime.timedelta(days=8)) is None
+
+
+def test_past_announced_date_falls_back_to_episodes():
+    data = {**_episodes(-30, 5), "new_seria_date": "2026-09-01"}
+    dates = normalize_series_dates(data)
+    assert dates.next_release(TODAY) == ReleaseDate(2026, 10, 23)
+    assert dates.status(TODAY) == ONGOING
+
+
+def test_past_announced_date_without_episodes():
+    assert normalize_series_dates({"new_seria_date": "2026-10-17", "seasons": []}).next_release(TODAY) is None
+    assert normalize_series_dates({"new_seria_date": "2026-09-00"}).next_release(TODAY) is None
+    assert normalize_series_dates({"new_seria_date": "2025"}).status(TODAY) == FINISHED
+
+
+def test_current_announced_period_is_kept():
+    assert normalize_series_dates({"new_seria_date": "2026-10-18"}).next_release(TODAY) == ReleaseDate(2026, 10, 18)
+    assert normalize_series_dates({"new_seria_date": "2026-10-00"}).next_release(TODAY) == ReleaseDate(2026, 10)
+    assert normalize_series_dates({"new_seria_date": "2026"}).next_release(TODAY) == ReleaseDate(2026)
+
+
+def test_status_and_has_dates():
+    assert normalize_series_dates({"is_next_season_in_prod": True}).status(TODAY) == IN_PRODUCTION
+    assert normalize_series_dates({"seasons": []}).status(TODAY) == FINISHED
+    assert not has_dates({})
+    assert not has_dates({"detail": "error"})
+    assert has_dates({"seasons": []})